@@ -11,6 +11,13 @@ from openai import OpenAI
 from playwright.async_api import async_playwright, BrowserContext, Page, Locator
 from dotenv import load_dotenv
 
+from libs.description_cache import DescriptionCache
+from libs.element_table import snapshot_table
+from libs.instrumentation import count, span, trace_from_env
+from libs.network_policy import apply_network_policy, interactive_policy, navigate
+from libs.llm_pipeline import DESCRIBE_INSTRUCTION, DESCRIBE_SYSTEM_PROMPT, DescriptionPipeline, element_prompt
+from libs.page_summarizer import stream_page_summary
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,12 +29,27 @@ if openai_api_key is None:
     raise ValueError("OPENAI_API_KEY environment variable not set.")
 
 client = OpenAI(api_key=openai_api_key)
+pipeline = DescriptionPipeline(api_key=openai_api_key, cache=DescriptionCache())
+
 
+async def summarize_page(page: Page, chunked: bool = True) -> str:
+    """Summarizes the page content using OpenAI.
 
-async def summarize_page(page: Page) -> str:
-    """Summarizes the page content using OpenAI."""
+    By default the whole page is summarized with a chunked map-reduce; with
+    chunked=False only the first 4000 characters are sent in one request.
+    """
+
+    if chunked:
+        try:
+            with span("summarize_page", chunked=True):
+                return "".join([piece async for piece in stream_page_summary(pipeline, page)]).strip()
+        except Exception as e:
+            logger.error(f"OpenAI API error during summarization: {e}")
+            return "Error summarizing page."
 
-    text_content = await page.evaluate("() => document.body.innerText")  # Extract all text
+    with span("extract_text"):
+        text_content = await page.evaluate("() => document.body.innerText")  # Extract all text
+        count("cdp_round_trips")
     prompt = f"""
     Summarize the following text content of a webpage concisely.
 
@@ -37,72 +59,79 @@ async def summarize_page(page: Page) -> str:
     """
 
     try:
-        response = client.chat.completions.create(  # No await here
-            model="gpt-3.5-turbo",
-            messages=[
+        # Cached by the page text fingerprint, so unchanged pages make no API call
+        with span("summarize_page", chars=len(text_content)):
+            summary = await pipeline.complete([
                 {"role": "system", "content": "You are a helpful assistant summarizing webpage content."},
                 {"role": "user", "content": prompt},
-            ],
-        )
-        summary = response.choices[0].message.content.strip()
+            ])
         return summary
     except Exception as e:
         logger.error(f"OpenAI API error during summarization: {e}")
         return "Error summarizing page."
 
 
-async def extract_interactive_elements(page: Page) -> List[Dict]:
-    """Extracts and describes interactive elements."""
+async def extract_interactive_elements(page: Page, batch: bool = True) -> List[Dict]:
+    """Extracts and describes interactive elements, several per request when `batch` is set."""
 
     elements = []
-    locators = await page.locator("a, button, input, [role='button']").all() # Target specific elements
+    snippets = {}
+    table = await snapshot_table(page, include_html=True) # Target specific elements, one round trip
 
-    for i, locator in enumerate(locators):
+    for i in range(len(table)):
         try:
-            bounding_box = await locator.bounding_box()
-            if bounding_box: # skip hidden elements
+            if table.visible[i]: # skip hidden elements
                 element_info = {}
-                element_info["element_id"] = await locator.get_attribute("id") or f"element_{i}" # Provide an id
-                element_info["name"] = await locator.get_attribute("name")
-                element_info["label"] = await locator.inner_text() # or get attribute aria-label
-                element_info["element_type"] = await locator.evaluate("el => el.tagName.toLowerCase()")
-
-                element_html = await locator.inner_html()
-                prompt = f"""Describe the functionality of the following HTML element: ```html {element_html} ```"""
-                try:
-                    response = client.chat.completions.create( # No await here
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant describing HTML elements."},
-                            {"role": "user", "content": prompt},
-                        ],
-                    )
-                    element_info["description"] = response.choices[0].message.content.strip()
-                except Exception as e:
-                    logger.error(f"OpenAI API error during description: {e}")
-                    element_info["description"] = "Error describing element."
+                element_info["element_id"] = table.attribute(i, "id") or f"element_{i}" # Provide an id
+                element_info["name"] = table.attribute(i, "name") or None
+                element_info["label"] = table.inner_texts[i] # or get attribute aria-label
+                element_info["element_type"] = table.tags[i]
+                element_info["selector"] = table.selector(i)
 
+                snippets[element_info["selector"]] = table.html[i]
                 elements.append(element_info)
         except Exception as e:
             logger.error(f"Error extracting element {i}: {e}")
 
+    # Describe all elements concurrently instead of one blocking call at a time
+    with span("describe_elements", elements=len(snippets), batch=batch):
+        if batch:
+            descriptions = await pipeline.describe_batched(snippets, DESCRIBE_INSTRUCTION, DESCRIBE_SYSTEM_PROMPT,
+                                                           error_text="Error describing element.")
+        else:
+            prompts = {key: element_prompt(DESCRIBE_INSTRUCTION, html) for key, html in snippets.items()}
+            descriptions = await pipeline.describe(prompts, DESCRIBE_SYSTEM_PROMPT,
+                                                   error_text="Error describing element.")
+    for element_info in elements:
+        element_info["description"] = descriptions[element_info["selector"]]
+
     return elements
 
 
 async def main():
+    trace_from_env()
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
         context = await browser.new_context()
+        monitor = await apply_network_policy(context, interactive_policy())
         page = await context.new_page()
 
-        await page.goto("https://parabank.parasoft.com/parabank/index.htm")
+        await navigate(page, "https://parabank.parasoft.com/parabank/index.htm", monitor)
 
-        page_summary = await summarize_page(page)
-        print("Page Summary:\n", page_summary)
+        # Streamed, so the summary starts printing before the last chunk is merged
+        print("Page Summary:")
+        try:
+            async for piece in stream_page_summary(pipeline, page):
+                print(piece, end="", flush=True)
+            print()
+        except Exception as e:
+            logger.error(f"OpenAI API error during summarization: {e}")
 
         interactive_elements = await extract_interactive_elements(page)
         print("\nInteractive Elements:\n", json.dumps(interactive_elements, indent=2))
 
+        logger.info(f"Description cache: {pipeline.cache.stats()}")
+
         await browser.close()
 
 
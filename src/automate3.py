@@ -14,7 +14,10 @@ from openai import OpenAI
 from playwright.async_api import async_playwright, BrowserContext, Page, Locator
 from dotenv import load_dotenv
 
+from libs.action_planner import run_plan
 from libs.find_elements_v1 import find_element_by_task
+from libs.instrumentation import span
+from libs.page_index import get_page_index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -94,7 +97,8 @@ async def perform_action(page: Page, element_info: Dict):
         if "locator" in element_info:  # Check if the locator is present
             locator = element_info["locator"]  # Retrieve the locator
             try:
-                await locator.click(timeout=5000)  # Use the locator directly
+                with span("action", kind="click", label=element_info.get("label")):
+                    await locator.click(timeout=5000)  # Use the locator directly
                 logger.info(f"Clicked on element: {element_info.get('label', 'N/A')}")
             except Exception as e:
                 logger.error(f"Error clicking element: {e}")
@@ -128,7 +132,8 @@ async def perform_action(page: Page, element_info: Dict):
 
 async def findAndClickThisTask(page:Page, task: str):
 
-    matching_element = await find_element_by_task(page, task)
+    # The page index keeps candidates across calls, so after an action only the DOM delta is re-scanned
+    matching_element = await find_element_by_task(page, task, index=get_page_index(page))
     if matching_element:
         print("found matching element")
         logging.info(pprint.pformat(matching_element))
@@ -137,3 +142,14 @@ async def findAndClickThisTask(page:Page, task: str):
     else:
         print(f"No element found matching the task: {task}")
 
+
+async def findAndClickTheseTasks(page: Page, tasks: List[str]) -> Dict:
+    """Runs several tasks in order; the next one is matched while the previous click's page loads."""
+
+    plan = await run_plan(page, tasks, matcher="task")
+    for step in plan["steps"]:
+        logger.info(f"{step['intent']}: {step['status']} in {step['seconds']:.2f}s"
+                    f" (prefetched: {step['prefetched']}, retries: {step['retries']})")
+    if not plan["ok"]:
+        print(f"Stopped at task: {plan['steps'][-1]['intent']}")
+    return plan
@@ -0,0 +1,141 @@
+# long-lived automation daemon with a warm browser pool
+# python automation_daemon.py serve --pool-size 4
+# python automation_daemon.py submit tasks.example.json
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+import urllib.request
+from typing import Dict
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from playwright.async_api import async_playwright
+
+from libs.browser_pool import BrowserPool
+from libs.intent_index import get_intent_index
+from libs.model_registry import DEFAULT_MODEL_NAME, get_model
+from libs.network_policy import interactive_policy
+from libs.task_runner import load_tasks, run_task
+
+DEFAULT_PORT = 8787
+
+
+async def serve(args):
+    async with async_playwright() as p:
+        policy = interactive_policy(blocked_resource_types=set(args.block), blocked_domains=args.block_domain)
+        pool = await BrowserPool(p, size=args.pool_size, headless=not args.headed,
+                                 max_memory_mb=args.max_memory_mb, policy=policy).start()
+        task_ids = itertools.count(1)  # Handed out synchronously, so concurrent tasks never share an id
+        intent_index = None if args.no_intent_index else get_intent_index()
+        if args.preload_model:
+            await asyncio.get_running_loop().run_in_executor(None, get_model, args.model)
+
+        async def run(task: Dict) -> Dict:
+            started = time.perf_counter()
+            context = await pool.acquire()
+            acquired = time.perf_counter() - started
+            try:
+                result = await run_task(context, task, matcher=args.matcher, model_name=args.model,
+                                        monitor=pool.monitor(context), intent_index=intent_index)
+            finally:
+                await pool.release(context)
+            result["acquire_seconds"] = acquired
+            return result
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            status, payload = 200, {}
+            try:
+                method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "GET" and path == "/health":
+                    payload = pool.health()
+                    if intent_index is not None:
+                        payload["intent_index"] = intent_index.stats()
+                elif method == "POST" and path == "/tasks":
+                    task = json.loads(body or b"{}")
+                    if "id" not in task:
+                        task["id"] = f"task_{next(task_ids)}"
+                    if "url" not in task or not isinstance(task.get("intents"), list):
+                        status, payload = 400, {"error": "task needs a 'url' and a list of 'intents'"}
+                    else:
+                        payload = await run(task)
+                else:
+                    status, payload = 404, {"error": f"no route for {method} {path}"}
+            except Exception as e:
+                logger.error(f"Daemon request failed: {e}")
+                status, payload = 500, {"error": str(e)}
+
+            data = json.dumps(payload).encode("utf-8")
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", args.port)
+        logger.info(f"Automation daemon listening on http://127.0.0.1:{args.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await pool.close()
+
+
+def submit(args):
+    for task in load_tasks(args.tasks):
+        request = urllib.request.Request(f"{args.daemon}/tasks", data=json.dumps(task).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        started = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            result = json.load(response)
+        result["round_trip_seconds"] = time.perf_counter() - started
+        print(json.dumps(result, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm browser daemon that runs url + intents tasks over HTTP.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Start the daemon")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--pool-size", type=int, default=4, help="Pre-created browser contexts")
+    serve_parser.add_argument("--max-memory-mb", type=float, default=2048, help="Restart the browser above this RSS")
+    serve_parser.add_argument("--matcher", choices=["links", "task"], default="links")
+    serve_parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    serve_parser.add_argument("--preload-model", action="store_true", help="Load the matcher model at startup")
+    serve_parser.add_argument("--headed", action="store_true")
+    serve_parser.add_argument("--block", nargs="*", default=[],
+                              help="Resource types to block, e.g. font media (default: none; blocked images"
+                                   " hide image-only links)")
+    serve_parser.add_argument("--block-domain", action="append", default=[], help="Block requests to this domain")
+    serve_parser.add_argument("--no-intent-index", action="store_true",
+                              help="Always run full retrieval instead of reusing resolved intents")
+
+    submit_parser = commands.add_parser("submit", help="Send a task file to a running daemon")
+    submit_parser.add_argument("tasks")
+    submit_parser.add_argument("--daemon", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    submit_parser.add_argument("--timeout", type=float, default=300)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args))
+    else:
+        submit(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# run many tasks headless in one browser
+# python batch_runner.py tasks.json --pool-size 8 --output results.json
+
+import argparse
+import asyncio
+import json
+import logging
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from playwright.async_api import async_playwright
+
+from libs.intent_index import get_intent_index
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.network_policy import NetworkPolicy
+from libs.task_runner import load_tasks, run_tasks
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a file of URL + intents tasks concurrently in one Chromium.")
+    parser.add_argument("tasks", help="JSON array or JSON Lines file of {\"url\", \"intents\"} tasks")
+    parser.add_argument("--pool-size", type=int, default=None, help="Concurrent browser contexts (default: CPU count)")
+    parser.add_argument("--matcher", choices=["links", "task"], default="links",
+                        help="map_intent_to_link ('links') or find_element_by_task ('task')")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Sentence transformer used by the matcher")
+    parser.add_argument("--output", default=None, help="Write aggregated results to this JSON file")
+    parser.add_argument("--headed", action="store_true", help="Show the browser")
+    parser.add_argument("--wait-until", choices=["domcontentloaded", "load", "networkidle"], default="domcontentloaded",
+                        help="Load state each navigation waits for")
+    parser.add_argument("--block", nargs="*", default=["image", "font", "media"],
+                        help="Resource types to block (pass none to block nothing)")
+    parser.add_argument("--block-domain", action="append", default=[], help="Block requests to this domain")
+    parser.add_argument("--no-intent-index", action="store_true",
+                        help="Always run full retrieval instead of reusing intents resolved on earlier runs")
+    args = parser.parse_args()
+
+    tasks = load_tasks(args.tasks)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+        policy = NetworkPolicy(blocked_resource_types=set(args.block), blocked_domains=args.block_domain,
+                               wait_until=args.wait_until)
+        intent_index = None if args.no_intent_index else get_intent_index()
+        summary = await run_tasks(browser, tasks, pool_size=args.pool_size, policy=policy, matcher=args.matcher,
+                                  model_name=args.model, intent_index=intent_index)
+        await browser.close()
+
+    logger.info(f"{summary['succeeded']}/{summary['tasks']} tasks succeeded in {summary['seconds']:.1f}s"
+                f" ({summary['tasks_per_second']:.2f} tasks/s, pool size {summary['pool_size']})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,274 @@
+# benchmark the matchers and describers on saved pages
+# python benchmark.py --repeat 5 --output bench/results/latest.json
+
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+import psutil
+from playwright.async_api import Page, async_playwright
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+
+
+class CountingPage:
+    """Wraps a Page and counts awaited calls, i.e. round trips to the browser."""
+
+    def __init__(self, page: Page):
+        self._page = page
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._page, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def counted(*args, **kwargs):
+            self.calls += 1
+            return await attribute(*args, **kwargs)
+
+        return counted
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def tree_rss_mb() -> float:
+    """Resident memory of this process and all of its children, the browser included."""
+    root = psutil.Process(os.getpid())
+    total = 0
+    for process in [root] + root.children(recursive=True):
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+class MemorySampler:
+    """Samples `tree_rss_mb` on a thread while a block runs and reports what it added.
+
+    ru_maxrss only ever grows and leaves out the browser, so runs measured after a
+    bigger one would all report its peak.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.before = self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, tree_rss_mb())
+
+    def __enter__(self) -> "MemorySampler":
+        self.before = self.peak = tree_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss_mb())
+
+    def report(self) -> Dict:
+        return {"rss_before_mb": self.before, "peak_rss_mb": self.peak, "peak_rss_delta_mb": self.peak - self.before}
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def load_script(name: str, filename: str):
+    """Imports one of the entry-point scripts (some have dashes in their names)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(os.path.abspath(__file__)), filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def summarize(latencies: List[float], extra: Dict) -> Dict:
+    return {
+        "queries": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        **extra,
+    }
+
+
+async def bench_matchers(page: Page, server, intents: List[Dict], repeat: int, model_name: str) -> Dict:
+    from libs.embedding_service import get_embedding_service
+    from libs.find_elements_v1 import find_element_by_task
+    from libs.intents_to_links import map_intent_to_link
+
+    matchers = {
+        "map_intent_to_link": lambda p, intent: map_intent_to_link(p, intent, model_name=model_name),
+        "find_element_by_task": lambda p, intent: find_element_by_task(p, intent, model_name=model_name),
+    }
+    service = get_embedding_service()
+    results = {}
+    for name, matcher in matchers.items():
+        latencies, cdp_calls, encode_calls, correct, misses = [], [], [], 0, []
+        with MemorySampler() as memory:
+            for labeled in intents:
+                await page.goto(server.url(labeled["page"]), wait_until="domcontentloaded")
+                for attempt in range(repeat):
+                    counting = CountingPage(page)
+                    batches_before = service.batches
+                    started = time.perf_counter()
+                    match = await matcher(counting, labeled["intent"])
+                    latencies.append(time.perf_counter() - started)
+                    cdp_calls.append(counting.calls)
+                    encode_calls.append(service.batches - batches_before)
+                    if attempt > 0:
+                        continue
+                    chosen = ""
+                    if match is not None:
+                        chosen = await match["locator"].first.evaluate("el => el.innerText || el.value || ''")
+                    if normalize(chosen) == normalize(labeled["expected"]):
+                        correct += 1
+                    else:
+                        misses.append({"intent": labeled["intent"], "expected": labeled["expected"],
+                                       "chosen": chosen})
+        results[name] = summarize(latencies, {
+            "cdp_calls_per_query": sum(cdp_calls) / len(cdp_calls),
+            "encode_calls_per_query": sum(encode_calls) / len(encode_calls),
+            "top1_accuracy": correct / len(intents),
+            "misses": misses,
+            **memory.report(),
+        })
+    return results
+
+
+async def bench_describers(page: Page, server, stub, pages: List[str], repeat: int) -> Dict:
+    automate2 = load_script("automate2", "automate2.py")
+    browser_automate = load_script("browser_automate", "browser-automate.py")
+
+    describers = {
+        "describe_elements": browser_automate.describe_elements,
+        "extract_interactive_elements": automate2.extract_interactive_elements,
+        "summarize_page": automate2.summarize_page,
+    }
+    results = {}
+    for name, describer in describers.items():
+        latencies, cdp_calls, llm_requests = [], [], []
+        with MemorySampler() as memory:
+            for page_name in pages:
+                await page.goto(server.url(page_name), wait_until="domcontentloaded")
+                for _ in range(repeat):
+                    counting = CountingPage(page)
+                    requests_before = stub.requests
+                    started = time.perf_counter()
+                    await describer(counting)
+                    latencies.append(time.perf_counter() - started)
+                    cdp_calls.append(counting.calls)
+                    llm_requests.append(stub.requests - requests_before)
+        results[name] = summarize(latencies, {
+            "cdp_calls_per_query": sum(cdp_calls) / len(cdp_calls),
+            "llm_requests_per_query": sum(llm_requests) / len(llm_requests),
+            **memory.report(),
+        })
+    return results
+
+
+async def load_model(model_name: str) -> Dict:
+    """Loads the matchers' model up front so its memory is not charged to whichever matcher runs first."""
+    from libs.embedding_service import get_embedding_service
+
+    with MemorySampler() as memory:
+        started = time.perf_counter()
+        await get_embedding_service().encode(model_name, ["warm up"])
+    return {"seconds": time.perf_counter() - started, **memory.report()}
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark element matching and description on saved pages.")
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, "fixtures"), help="Directory of saved HTML pages")
+    parser.add_argument("--intents", default=os.path.join(BENCH_DIR, "intents.json"), help="Labeled intent set")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query; later runs see warm caches")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds the stub LLM takes per request")
+    parser.add_argument("--model", default=None, help="Sentence transformer for the matchers")
+    parser.add_argument("--skip-describers", action="store_true")
+    parser.add_argument("--output", default=None, help="Results JSON (default: bench/results/<commit>.json)")
+    args = parser.parse_args()
+
+    # Isolate the run from the user's caches so results compare across commits.
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(scratch, "embeddings")
+    os.environ["DESCRIPTION_CACHE_PATH"] = os.path.join(scratch, "descriptions.sqlite3")
+
+    from libs.fixture_server import FixtureServer
+    from libs.llm_stub_server import StubServer
+    from libs.model_registry import DEFAULT_MODEL_NAME
+
+    with open(args.intents, "r", encoding="utf-8") as f:
+        intents = json.load(f)
+    model_name = args.model or DEFAULT_MODEL_NAME
+
+    with FixtureServer(args.fixtures) as server, StubServer(latency=args.llm_latency) as stub:
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+        with MemorySampler() as memory:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=True)
+                page = await browser.new_page()
+                report = {
+                    "commit": current_commit(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "model": model_name,
+                    "repeat": args.repeat,
+                    "model_load": await load_model(model_name),
+                    "matchers": await bench_matchers(page, server, intents, args.repeat, model_name),
+                }
+                if not args.skip_describers:
+                    pages = sorted({labeled["page"] for labeled in intents})
+                    report["describers"] = await bench_describers(page, server, stub, pages, args.repeat)
+                await browser.close()
+
+    report["peak_rss_mb"] = memory.peak
+    output = args.output or os.path.join(BENCH_DIR, "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for section in ("matchers", "describers"):
+        for name, values in report.get(section, {}).items():
+            accuracy = f", top-1 {values['top1_accuracy']:.0%}" if "top1_accuracy" in values else ""
+            print(f"{name}: p50 {values['p50_ms']:.1f} ms, p95 {values['p95_ms']:.1f} ms,"
+                  f" {values['cdp_calls_per_query']:.1f} CDP calls/query{accuracy}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
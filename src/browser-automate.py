@@ -9,6 +9,11 @@ from openai import OpenAI
 from playwright.async_api import async_playwright, BrowserContext, Page, Locator
 from dotenv import load_dotenv
 
+from libs.description_cache import DescriptionCache
+from libs.dom_snapshot import snapshot_candidates, stamp_selector
+from libs.network_policy import apply_network_policy, interactive_policy, navigate
+from libs.llm_pipeline import DescriptionPipeline, element_prompt
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,53 +29,39 @@ if openai_api_key is None:
     raise ValueError("OPENAI_API_KEY environment variable not set. Create a .env file with OPENAI_API_KEY=\"your_actual_key\"")
 
 client = OpenAI(api_key=openai_api_key)
+pipeline = DescriptionPipeline(api_key=openai_api_key, cache=DescriptionCache())
+
+DESCRIBE_SYSTEM_PROMPT = "You are a helpful assistant describing HTML elements."
+DESCRIBE_INSTRUCTION = """Describe the functionality of the following HTML element in a web page context.
+Be concise and focus on what the user would expect to happen when interacting with it (e.g., clicking, hovering, etc.).  If the element is purely decorative or serves no interactive purpose, say "Decorative"."""
 
 
 # Define a function to get element descriptions using OpenAI
-async def describe_elements(page: Page) -> Dict[str, str]:
-    """Uses OpenAI to describe the functionality of elements on a page."""
+async def describe_elements(page: Page, batch: bool = True) -> Dict[str, str]:
+    """Uses OpenAI to describe the functionality of elements on a page.
+
+    With `batch`, several elements are packed into each request; otherwise every
+    element gets its own request.
+    """
 
     elements = {}
-    locators = await page.locator("*").all()  # Await the locator retrieval
-
-    for i, locator in enumerate(locators):
-        try:
-            bounding_box = await locator.bounding_box()
-            if bounding_box:  # Skip elements without visible bounding boxes
-                try:
-                    element_html = await locator.inner_html()
-                except Exception as e:
-                    logger.error(f"Error getting inner HTML for element {i}: {e}")
-                    element_html = ""  # or handle it as you see fit.
-
-                prompt = f"""
-                Describe the functionality of the following HTML element in a web page context. 
-                Be concise and focus on what the user would expect to happen when interacting with it (e.g., clicking, hovering, etc.).  If the element is purely decorative or serves no interactive purpose, say "Decorative".
-
-                ```html
-                {element_html}
-                ```
-                """
-
-                try:  # Correct try block placement
-                    response = client.chat.completions.create(  # Await here
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant describing HTML elements."},
-                            {"role": "user", "content": prompt},
-                        ],
-                    )
-                    description = response.choices[0].message.content.strip()
-                    elements[f"element_{i}"] = description
-                    logger.info(f"Element {i}: {description}")
-                except Exception as e:  # Catch exceptions related to OpenAI API
-                    logger.error(f"OpenAI API error: {e}")
-                    elements[f"element_{i}"] = "Error with OpenAI API"
-            else:
-                logger.info(f"Skipping invisible element {i}")  # Log skipped elements
-        except Exception as e:
-            logger.error(f"Error describing element {i}: {e}")
-            elements[f"element_{i}"] = "Error describing element"  # Handle errors gracefully
+    snippets = {}
+    # Pruned in the page to visible, interactive or meaningful nodes, in one round trip
+    snapshot = await snapshot_candidates(page, include_html=True)
+
+    for i in range(len(snapshot)):
+        # Keyed by the element's stamp so the key stays valid if the DOM shifts
+        snippets[f"element_{snapshot.id[i]}"] = snapshot.html[i] or ""
+
+    # Descriptions run concurrently, bounded by the pipeline's semaphore and rate limit
+    if batch:
+        descriptions = await pipeline.describe_batched(snippets, DESCRIBE_INSTRUCTION, DESCRIBE_SYSTEM_PROMPT)
+    else:
+        prompts = {key: element_prompt(DESCRIBE_INSTRUCTION, html) for key, html in snippets.items()}
+        descriptions = await pipeline.describe(prompts, DESCRIBE_SYSTEM_PROMPT)
+    for element_key, description in descriptions.items():
+        logger.info(f"{element_key}: {description}")
+    elements.update(descriptions)
 
     return elements
 
@@ -90,22 +81,17 @@ async def perform_task(page: Page, task: str):
     """
 
     try: # Correct try block placement
-        response = client.chat.ChatCompletion.create(  # Await here
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an assistant that identifies elements on a webpage based on their description and a user task."},
-                {"role": "user", "content": prompt},
-            ],
-        )
-
-        element_key = response.choices[0].message.content.strip()
+        element_key = await pipeline.complete([
+            {"role": "system", "content": "You are an assistant that identifies elements on a webpage based on their description and a user task."},
+            {"role": "user", "content": prompt},
+        ])
 
         
         if element_key != "None" and element_key in elements:
             try:
 
-                element_index = int(element_key.split("_")[1]) # extract index
-                locator = page.locator("*").nth(element_index) # locate using nth index
+                stamp_id = element_key.split("_")[1] # extract stamp
+                locator = page.locator(stamp_selector(stamp_id)) # locate by stable selector
                 await locator.click()
                 logger.info(f"Performed task: {task} by clicking on {element_key}")
             except Exception as e:
@@ -122,9 +108,10 @@ async def main():
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)  # Set headless=True for production
         context = await browser.new_context()
+        monitor = await apply_network_policy(context, interactive_policy())
         page = await context.new_page()
 
-        await page.goto("https://parabank.parasoft.com/parabank/index.htm")  # Replace with your target URL
+        await navigate(page, "https://parabank.parasoft.com/parabank/index.htm", monitor)  # Replace with your target URL
 
         await perform_task(page, "Click on the more information link.")  # Example task
         await perform_task(page, "Click the link.")  # Example task
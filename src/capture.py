@@ -0,0 +1,74 @@
+# save pages for offline replay
+# python capture.py https://parabank.parasoft.com/parabank/index.htm --out captures
+# python capture.py --url-file urls.txt --out captures --pool-size 8
+
+import argparse
+import asyncio
+import logging
+import time
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from playwright.async_api import async_playwright
+
+from libs.browser_pool import BrowserPool
+from libs.network_policy import NetworkPolicy, navigate
+from libs.page_capture import capture_page
+
+
+def read_urls(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Save elements, text, accessibility tree and a screenshot per page.")
+    parser.add_argument("urls", nargs="*", help="Pages to capture")
+    parser.add_argument("--url-file", help="File with one URL per line")
+    parser.add_argument("--out", default="captures", help="Directory the captures are written to")
+    parser.add_argument("--pool-size", type=int, default=4, help="Pages captured concurrently")
+    parser.add_argument("--wait-until", choices=["domcontentloaded", "load", "networkidle"], default="load",
+                        help="Load state each navigation waits for before capturing")
+    parser.add_argument("--no-block", action="store_true",
+                        help="Load images and fonts too, so screenshots look like the live page")
+    parser.add_argument("--no-screenshot", action="store_true", help="Skip screenshots")
+    parser.add_argument("--headed", action="store_true", help="Show the browser")
+    args = parser.parse_args()
+
+    urls = args.urls + (read_urls(args.url_file) if args.url_file else [])
+    if not urls:
+        parser.error("no URLs given")
+
+    policy = NetworkPolicy(wait_until=args.wait_until)
+    if args.no_block:
+        policy.blocked_resource_types = set()
+
+    started = time.perf_counter()
+    failed = 0
+    async with async_playwright() as p:
+        pool = await BrowserPool(p, size=args.pool_size, headless=not args.headed, policy=policy).start()
+
+        async def capture(url: str):
+            nonlocal failed
+            context = await pool.acquire()
+            try:
+                page = await context.new_page()
+                await navigate(page, url, pool.monitor(context))
+                saved = await capture_page(page, args.out, screenshot=not args.no_screenshot)
+                logger.info(f"Captured {url} ({saved.elements} elements) to {saved.directory}")
+            except Exception as e:
+                failed += 1
+                logger.error(f"Capturing {url} failed: {e}")
+            finally:
+                await pool.release(context)
+
+        await asyncio.gather(*(capture(url) for url in urls))
+        await pool.close()
+
+    logger.info(f"Captured {len(urls) - failed}/{len(urls)} pages in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
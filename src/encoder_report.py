@@ -0,0 +1,181 @@
+# compare encoder backends on accuracy, latency and memory
+# python encoder_report.py
+# python encoder_report.py --specs all-mpnet-base-v2 onnx-int8:all-mpnet-base-v2 onnx-int8:all-MiniLM-L6-v2
+# python encoder_report.py --captures captures --intents labels.jsonl
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import time
+from typing import Dict, List
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from libs.element_table import ElementTable
+from libs.model_registry import DEFAULT_MODEL_NAME, FAST_MODEL_NAME
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+
+DEFAULT_SPECS = [
+    DEFAULT_MODEL_NAME,
+    f"onnx:{DEFAULT_MODEL_NAME}",
+    f"onnx-int8:{DEFAULT_MODEL_NAME}",
+    FAST_MODEL_NAME,
+    f"onnx-int8:{FAST_MODEL_NAME}",
+]
+
+
+def _candidates(table: ElementTable) -> Dict[str, List[str]]:
+    """The texts map_intent_to_link embeds for a table, and the labels a match is judged by."""
+    return {"texts": table.embedding_texts("link"), "labels": list(table.texts)}
+
+
+async def snapshot_fixtures(fixtures: str, intents: List[Dict]) -> Dict[str, Dict[str, List[str]]]:
+    """Loads each labeled fixture in a browser and snapshots it exactly as the matchers do."""
+    from playwright.async_api import async_playwright
+
+    from libs.element_table import snapshot_table
+    from libs.fixture_server import FixtureServer
+
+    pages = {}
+    with FixtureServer(fixtures) as server:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            for name in sorted({labeled["page"] for labeled in intents}):
+                await page.goto(server.url(name), wait_until="domcontentloaded")
+                pages[name] = _candidates(await snapshot_table(page))
+            await browser.close()
+    return pages
+
+
+def load_captures(root: str, intents: List[Dict]):
+    """Uses element tables saved by capture.py; labels are matched to captures as replay.py does."""
+    from libs.page_capture import PageCapture, iter_captures
+    from libs.replay_engine import assign_labels
+
+    assigned = assign_labels(list(iter_captures(root)), intents)
+    pages = {directory: _candidates(PageCapture.load(directory).table()) for directory in assigned}
+    labeled = [dict(label, page=directory) for directory, labels in assigned.items() for label in labels
+               if label.get("expected")]
+    return pages, labeled
+
+
+def measure(spec: str, pages: Dict[str, Dict[str, List[str]]], intents: List[Dict], repeat: int) -> Dict:
+    """Runs in a fresh process per spec so load time and peak memory are not shared."""
+    from libs.model_registry import get_model
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    started = time.perf_counter()
+    model = get_model(spec)
+    load_seconds = time.perf_counter() - started
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return np.asarray(model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True),
+                          dtype=np.float32)
+
+    page_texts = {name: candidates["texts"] for name, candidates in pages.items()}
+    all_texts = [text for texts in page_texts.values() for text in texts]
+    encode(all_texts[:8])  # Warm-up: first calls allocate kernels and arenas
+
+    query_latencies = []
+    for _ in range(repeat):
+        for labeled in intents:
+            query_started = time.perf_counter()
+            encode([labeled["intent"]])
+            query_latencies.append(time.perf_counter() - query_started)
+
+    batch_started = time.perf_counter()
+    for _ in range(repeat):
+        encode(all_texts)
+    batch_seconds = (time.perf_counter() - batch_started) / repeat
+
+    page_embeddings = {name: encode(texts) for name, texts in page_texts.items()}
+    intent_embeddings = encode([labeled["intent"] for labeled in intents])
+    correct = 0
+    for labeled, query in zip(intents, intent_embeddings):
+        best = int(np.argmax(page_embeddings[labeled["page"]] @ query))
+        chosen = pages[labeled["page"]]["labels"][best]
+        correct += " ".join(chosen.split()).lower() == " ".join(labeled["expected"].split()).lower()
+
+    query_latencies.sort()
+    return {
+        "spec": spec,
+        "load_seconds": load_seconds,
+        "query_p50_ms": query_latencies[len(query_latencies) // 2] * 1000,
+        "query_p95_ms": query_latencies[min(len(query_latencies) - 1, int(len(query_latencies) * 0.95))] * 1000,
+        "batch_texts_per_second": len(all_texts) / batch_seconds,
+        "top1_accuracy": correct / len(intents),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "model_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - rss_before,
+        "embeddings": np.concatenate([intent_embeddings, *page_embeddings.values()]).tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy versus latency and memory for encoder backends.")
+    parser.add_argument("--specs", nargs="+", default=DEFAULT_SPECS,
+                        help="Model specs to compare; the first is the reference for embedding agreement")
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, "fixtures"))
+    parser.add_argument("--intents", default=os.path.join(BENCH_DIR, "intents.json"))
+    parser.add_argument("--captures", help="Directory written by capture.py, used instead of snapshotting --fixtures")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results", "encoders.json"))
+    args = parser.parse_args()
+
+    if args.captures:
+        from libs.replay_engine import load_labels
+
+        pages, intents = load_captures(args.captures, load_labels(args.intents))
+    else:
+        with open(args.intents, "r", encoding="utf-8") as f:
+            intents = json.load(f)
+        pages = asyncio.run(snapshot_fixtures(args.fixtures, intents))
+    if not intents:
+        parser.error("no labeled intents match the pages")
+
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    for spec in args.specs:
+        with spawn.Pool(1) as pool:
+            try:
+                results.append(pool.apply(measure, (spec, pages, intents, args.repeat)))
+            except Exception as e:
+                logger.error(f"Skipping '{spec}': {e}")
+
+    if not results:
+        return
+    reference = results[0]
+    reference_embeddings = np.asarray(reference["embeddings"], dtype=np.float32)
+    for result in results:
+        embeddings = np.asarray(result.pop("embeddings"), dtype=np.float32)
+        result["speedup"] = reference["query_p50_ms"] / result["query_p50_ms"]
+        result["memory_ratio"] = result["model_rss_mb"] / reference["model_rss_mb"] if reference["model_rss_mb"] else None
+        # Only comparable when both specs share the underlying model (same embedding space)
+        if embeddings.shape == reference_embeddings.shape:
+            result["mean_cosine_to_reference"] = float(np.mean(np.sum(embeddings * reference_embeddings, axis=1)))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"reference": reference["spec"], "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "results": results}, f, indent=2)
+
+    print(f"{'spec':40} {'top-1':>6} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'speedup':>8} {'model MB':>9} {'cosine':>7}")
+    for result in results:
+        cosine = result.get("mean_cosine_to_reference")
+        print(f"{result['spec']:40} {result['top1_accuracy']:>6.0%} {result['query_p50_ms']:>8.1f}"
+              f" {result['query_p95_ms']:>8.1f} {result['batch_texts_per_second']:>9.0f} {result['speedup']:>7.1f}x"
+              f" {result['model_rss_mb']:>9.0f} {cosine if cosine is not None else float('nan'):>7.3f}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from playwright.async_api import Page
+
+from libs.embedding_cache import get_embedding_cache
+from libs.embedding_matcher import encode_texts_async
+from libs.find_elements_v1 import find_element_by_task
+from libs.instrumentation import span
+from libs.intent_index import IntentIndex
+from libs.intents_to_links import map_intent_to_link
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.page_index import get_page_index
+
+logger = logging.getLogger(__name__)
+
+
+class ActionPlanner:
+    """Runs an ordered list of intents on one page, one click per intent.
+
+    While the page settles after a click, the next intent is already being
+    resolved: as soon as the new document's DOM is parsed its candidates are
+    extracted and ranked, so by the time the page reaches `settle_state` the
+    next click is usually ready. A prefetch is discarded if another navigation
+    happened after it started, and a click whose locator went stale re-resolves
+    the intent against the current page, up to `max_retries` times.
+
+    Args:
+        page: The Playwright Page object.
+        matcher: "links" for map_intent_to_link or "task" for find_element_by_task.
+        model_name: Sentence transformer used by the matcher.
+        settle_state: Load state a step waits for after its click.
+        click_timeout: Milliseconds a click auto-waits for its element.
+        max_retries: Re-resolutions allowed per step when a locator is stale.
+        intent_index: Optional memo of intents resolved on earlier runs.
+    """
+
+    def __init__(self, page: Page, matcher: str = "links", model_name: str = DEFAULT_MODEL_NAME,
+                 settle_state: str = "load", click_timeout: float = 5000, max_retries: int = 2,
+                 intent_index: Optional[IntentIndex] = None):
+        if matcher not in ("links", "task"):
+            raise ValueError(f"Unknown matcher: {matcher}")
+        self.page = page
+        self.matcher = matcher
+        self.model_name = model_name
+        self.settle_state = settle_state
+        self.click_timeout = click_timeout
+        self.max_retries = max_retries
+        self.intent_index = intent_index
+        self._navigations = 0
+        self._clicked_at = 0  # Navigation count just before the last click
+        self._navigated = asyncio.Event()
+
+    def _on_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self._navigations += 1
+            self._navigated.set()
+
+    async def resolve(self, intent: str) -> Optional[Dict]:
+        """Finds the element for `intent` on the current page (incrementally, via the page index)."""
+        index = get_page_index(self.page)
+        if self.matcher == "links":
+            return await map_intent_to_link(self.page, intent, model_name=self.model_name, index=index,
+                                            intent_index=self.intent_index)
+        return await find_element_by_task(self.page, intent, model_name=self.model_name, index=index)
+
+    async def _prefetch(self, intent: str, clicked_at: int):
+        """Resolves `intent` once the next document is parsed; returns (navigation count, match).
+
+        Waits for a navigation past `clicked_at` first: right after the click the old
+        document is still current, and its load state has long been reached.
+        """
+        while self._navigations == clicked_at:
+            self._navigated.clear()
+            await self._navigated.wait()
+        await self.page.wait_for_load_state("domcontentloaded")
+        navigations = self._navigations
+        with span("prefetch", intent=intent):
+            return navigations, await self.resolve(intent)
+
+    async def run(self, intents: List[str]) -> Dict:
+        """Executes `intents` in order and reports each step; stops at the first step that fails."""
+        started = time.perf_counter()
+        result = {"steps": [], "ok": True}
+        self.page.on("framenavigated", self._on_navigated)
+        # The intents' own embeddings don't depend on the page: compute them all up front in one batch.
+        warmup = asyncio.create_task(encode_texts_async(self.model_name, intents,
+                                                        cache=get_embedding_cache(self.model_name)))
+        prefetched = None
+        try:
+            for i, intent in enumerate(intents):
+                step = await self._step(intent, prefetched)
+                prefetched = None
+                result["steps"].append(step)
+                if step["status"] != "clicked":
+                    result["ok"] = False
+                    break
+
+                next_intent = intents[i + 1] if i + 1 < len(intents) else None
+                prefetch = asyncio.create_task(self._prefetch(next_intent, self._clicked_at)) if next_intent else None
+                try:
+                    settle_started = time.perf_counter()
+                    with span("settle", state=self.settle_state):
+                        await self.page.wait_for_load_state(self.settle_state)
+                    step["settle_seconds"] = time.perf_counter() - settle_started
+                    step["seconds"] += step["settle_seconds"]
+                    if prefetch is not None and self._navigations == self._clicked_at:
+                        logger.info(f"Not prefetching '{next_intent}': the click did not navigate")
+                    elif prefetch is not None:
+                        try:
+                            navigations, match = await prefetch
+                            if navigations == self._navigations:
+                                prefetched = match
+                            else:
+                                logger.info(f"Discarding prefetch for '{next_intent}': the page navigated again")
+                        except Exception as e:
+                            logger.warning(f"Prefetch for '{next_intent}' failed, resolving it in place: {e}")
+                finally:
+                    if prefetch is not None and not prefetch.done():
+                        prefetch.cancel()
+                    elif prefetch is not None and not prefetch.cancelled():
+                        prefetch.exception()  # Retrieved, so an unawaited failure is not reported again
+        finally:
+            self.page.remove_listener("framenavigated", self._on_navigated)
+            if not warmup.done():
+                warmup.cancel()
+            elif not warmup.cancelled() and warmup.exception() is not None:
+                logger.warning(f"Precomputing intent embeddings failed: {warmup.exception()}")
+
+        result["seconds"] = time.perf_counter() - started
+        result["settle_seconds"] = sum(step.get("settle_seconds", 0.0) for step in result["steps"])
+        return result
+
+    async def _step(self, intent: str, prefetched: Optional[Dict]) -> Dict:
+        step_started = time.perf_counter()
+        step = {"intent": intent, "prefetched": prefetched is not None, "retries": 0, "resolve_seconds": 0.0}
+        match = prefetched
+        with span("step", intent=intent) as stage:
+            while True:
+                try:
+                    if step["prefetched"] and await match["locator"].count() == 0:
+                        match = None  # The prefetched element is gone; resolve against the current DOM
+                        step["prefetched"] = False
+                    if match is None:
+                        resolve_started = time.perf_counter()
+                        match = await self.resolve(intent)
+                        step["resolve_seconds"] += time.perf_counter() - resolve_started
+                    if match is None:
+                        step["status"] = "no_match"
+                        break
+                    step["label"] = " ".join((match.get("label") or "").split())
+                    step["similarity"] = float(match["similarity"])
+                    step["memoized"] = bool(match.get("memoized"))
+                    click_started = time.perf_counter()
+                    self._clicked_at = self._navigations
+                    with span("action", kind="click", label=step["label"]):
+                        await match["locator"].click(timeout=self.click_timeout)  # Auto-waits for actionability
+                    step["click_seconds"] = time.perf_counter() - click_started
+                    step["status"] = "clicked"
+                    break
+                except Exception as e:
+                    if step["retries"] >= self.max_retries:
+                        logger.error(f"Step '{intent}' failed after {step['retries']} retries: {e}")
+                        step["status"] = "error"
+                        step["error"] = str(e)
+                        break
+                    step["retries"] += 1
+                    step["prefetched"] = False
+                    logger.warning(f"Locator for '{intent}' went stale ({e}), re-resolving")
+                    match = None
+            stage.set(status=step["status"], prefetched=step["prefetched"], retries=step["retries"])
+        step["seconds"] = time.perf_counter() - step_started
+        return step
+
+
+async def run_plan(page: Page, intents: List[str], **kwargs) -> Dict:
+    """Convenience wrapper: `ActionPlanner(page, **kwargs).run(intents)`."""
+    return await ActionPlanner(page, **kwargs).run(intents)
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Set
+
+from playwright.async_api import Browser, BrowserContext, Playwright
+
+from libs.network_policy import NetworkMonitor, NetworkPolicy, apply_network_policy, interactive_policy
+
+try:
+    import psutil
+except ImportError:  # Memory-based restarts are skipped without psutil
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_BROWSER_PROCESS_NAMES = ("chrom", "headless_shell")
+
+
+def _descendant_pids() -> Set[int]:
+    if psutil is None:
+        return set()
+    return {child.pid for child in psutil.Process(os.getpid()).children(recursive=True)}
+
+
+def _find_browser_process(before: Set[int]):
+    """The browser a launch just started: a new process whose parent (the Playwright driver) is not new."""
+    if psutil is None:
+        return None
+    fresh = [child for child in psutil.Process(os.getpid()).children(recursive=True) if child.pid not in before]
+    fresh_pids = {child.pid for child in fresh}
+    roots = []
+    for child in fresh:
+        try:
+            if child.ppid() not in fresh_pids:
+                roots.append(child)
+        except psutil.Error:
+            pass
+    for root in roots:
+        try:
+            if any(name in root.name().lower() for name in _BROWSER_PROCESS_NAMES):
+                return root
+        except psutil.Error:
+            pass
+    if roots:
+        return roots[0]
+    logger.warning("Could not find the browser process; memory-based restarts are off")
+    return None
+
+
+class BrowserPool:
+    """A warm Chromium with pre-created, recycled browser contexts.
+
+    Contexts are handed out with `acquire` and given back with `release`, which
+    closes them and queues a fresh one, so no task sees another's cookies, storage,
+    service workers or HTTP cache; the browser itself stays warm. A background
+    health check tops the pool back up and relaunches the browser if it disconnects
+    or its process tree uses more than `max_memory_mb`. Without a `policy`, contexts
+    get `interactive_policy()`: tasks click, and blocked images would hide
+    image-only links.
+    """
+
+    def __init__(self, playwright: Playwright, size: int = 4, headless: bool = True,
+                 max_memory_mb: Optional[float] = 2048, health_interval: float = 10.0,
+                 policy: Optional[NetworkPolicy] = None):
+        self.playwright = playwright
+        self.size = size
+        self.headless = headless
+        self.max_memory_mb = max_memory_mb
+        self.health_interval = health_interval
+        self.policy = policy or interactive_policy()
+
+        self.browser: Optional[Browser] = None
+        self._browser_process = None  # psutil.Process of the current browser, once found
+        self.restarts = 0
+        self.tasks_served = 0
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._monitors: Dict[BrowserContext, NetworkMonitor] = {}
+        self._owners: Dict[BrowserContext, Browser] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        self._restart_lock = asyncio.Lock()
+        self._fill_lock = asyncio.Lock()  # One path at a time creates contexts, so the pool never exceeds `size`
+
+    async def start(self) -> "BrowserPool":
+        started = time.perf_counter()
+        await self._launch()
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"Browser pool warm with {self.size} contexts in {time.perf_counter() - started:.2f}s")
+        return self
+
+    async def _launch(self):
+        before = _descendant_pids()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        self._browser_process = _find_browser_process(before)
+        await self._fill()
+
+    async def _fill(self):
+        """Creates contexts on the current browser until it has `size` of them."""
+        async with self._fill_lock:
+            while self.browser.is_connected() and self._live_contexts() < self.size:
+                await self._idle.put(await self._new_context())
+
+    async def _new_context(self) -> BrowserContext:
+        context = await self.browser.new_context()
+        self._owners[context] = self.browser
+        self._monitors[context] = await apply_network_policy(context, self.policy)
+        return context
+
+    async def acquire(self) -> BrowserContext:
+        return await self._idle.get()
+
+    def monitor(self, context: BrowserContext) -> NetworkMonitor:
+        return self._monitors[context]
+
+    async def release(self, context: BrowserContext):
+        """Closes a finished task's context and queues a fresh one in its place.
+
+        Clearing cookies is not enough: localStorage, sessionStorage, IndexedDB,
+        service workers and the HTTP cache all belong to the context, and a new
+        context on a warm browser costs milliseconds.
+        """
+        self.tasks_served += 1
+        retired = self._owners.get(context) is not self.browser
+        await self._discard(context)
+        if not retired:
+            await self._replenish()
+
+    async def _replenish(self):
+        try:
+            await self._fill()
+        except Exception as e:
+            logger.error(f"Creating a browser context failed, the health check will retry: {e}")
+
+    def _live_contexts(self) -> int:
+        return sum(1 for owner in self._owners.values() if owner is self.browser)
+
+    async def _discard(self, context: BrowserContext):
+        owner = self._owners.pop(context, None)
+        self._monitors.pop(context, None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        # Close a retired browser once its last context has come back.
+        if owner is not None and owner is not self.browser and owner not in self._owners.values():
+            try:
+                await owner.close()
+            except Exception as e:
+                logger.warning(f"Closing a retired browser failed: {e}")
+
+    def memory_mb(self) -> Optional[float]:
+        """Resident memory of the current browser's process tree, if psutil is available.
+
+        Only the browser launched last is counted, not the Playwright driver, encoder
+        workers or retired browsers still finishing tasks, so a restart brings it down.
+        """
+        if self._browser_process is None:
+            return None
+        try:
+            processes = [self._browser_process] + self._browser_process.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                memory = self.memory_mb()
+                if not self.browser.is_connected():
+                    await self.restart("browser disconnected")
+                elif self.max_memory_mb and memory is not None and memory > self.max_memory_mb:
+                    await self.restart(f"memory {memory:.0f} MB over {self.max_memory_mb:.0f} MB")
+                else:
+                    await self._fill()
+            except Exception as e:
+                logger.error(f"Browser pool health check failed: {e}")
+
+    async def restart(self, reason: str):
+        """Launches a fresh browser; contexts in use finish on the old one and are then discarded."""
+        async with self._restart_lock:
+            logger.warning(f"Restarting browser pool: {reason}")
+            self.restarts += 1
+            old = self.browser
+            while not self._idle.empty():
+                await self._discard(self._idle.get_nowait())
+            await self._launch()
+            if not old.is_connected() or old not in self._owners.values():
+                try:
+                    await old.close()
+                except Exception:
+                    pass
+
+    def health(self) -> Dict:
+        return {
+            "connected": bool(self.browser and self.browser.is_connected()),
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "tasks_served": self.tasks_served,
+            "restarts": self.restarts,
+            "memory_mb": self.memory_mb(),
+        }
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        if self.browser is not None:
+            await self.browser.close()
@@ -0,0 +1,138 @@
+import atexit
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "automation", "descriptions.sqlite3")
+
+# Stamps added by libs.dom_snapshot show up inside inner HTML and change between runs.
+_STAMP_PATTERN = re.compile(r'\sdata-automation-id="[^"]*"')
+
+
+def fingerprint(content: str) -> str:
+    """Normalized hash of element HTML or page text: stamps removed, whitespace collapsed."""
+    normalized = re.sub(r"\s+", " ", _STAMP_PATTERN.sub("", content or "")).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """Persistent SQLite cache for LLM responses, keyed by model, prompt template
+    version and a fingerprint of the described content.
+
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored the
+    least recently used ones are evicted. Reads never commit: last-used times are
+    written with the next put, so a lookup is a single SELECT. Callers on an event
+    loop run these methods in a worker thread.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 20000):
+        self.path = path or os.getenv("DESCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._touched: Dict[str, float] = {}  # key -> last hit, written with the next put or flush
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, tokens INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(model: str, template_version: str, content: str) -> str:
+        return f"{model}:{template_version}:{fingerprint(content)}"
+
+    def get(self, model: str, template_version: str, content: str) -> Optional[str]:
+        return self.get_many(model, template_version, [content])[0]
+
+    def get_many(self, model: str, template_version: str, contents: List[str]) -> List[Optional[str]]:
+        """Looks up several contents with one query; hits are marked used with the next write."""
+        keys = [self.key(model, template_version, content) for content in contents]
+        now = time.time()
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = unique[start:start + 500]
+                found.update((row[0], row[1:]) for row in self._conn.execute(
+                    f"SELECT key, response, tokens, created_at FROM responses WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk))
+            results = []
+            for key in keys:
+                row = found.get(key)
+                if row is None or now - row[2] > self.ttl_seconds:  # Expired rows are deleted by the next write
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self._touched[key] = now
+                self.hits += 1
+                self.tokens_saved += row[1]
+                results.append(row[0])
+            return results
+
+    def put(self, model: str, template_version: str, content: str, response: str, tokens: int = 0):
+        """Stores a response; `tokens` is the estimated prompt plus completion size it saves on reuse."""
+        self.put_many(model, template_version, [(content, response, tokens)])
+
+    def put_many(self, model: str, template_version: str, entries: List[Tuple[str, str, int]]):
+        """Stores (content, response, tokens) entries and pending last-used times in one transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, response, tokens, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(self.key(model, template_version, content), response, tokens, now, now)
+                 for content, response, tokens in entries],
+            )
+            self._write_touched()
+            self._evict(now)
+            self._conn.commit()
+
+    def flush(self):
+        """Writes pending last-used times."""
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                   [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "entries": entries,
+        }
@@ -0,0 +1,176 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from playwright.async_api import Locator, Page
+
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_SELECTOR = "a, button, input, [role='button']"
+
+# Attribute stamped on every snapshotted element so it can be found again later
+# without walking the DOM by index.
+SNAPSHOT_ATTRIBUTE = "data-automation-id"
+
+# Shared by every script that returns snapshot rows: visibility check and the
+# columnar row builder that stamps each element with a stable id.
+COLLECT_ROWS_JS = """
+    const isVisible = (el, rect, style) => rect.width > 0 && rect.height > 0
+        && style.visibility !== 'hidden' && style.display !== 'none';
+
+    const collectRows = (nodes, stamp, includeHtml) => {
+        window.__automationSeq = window.__automationSeq || 0;
+        const out = {id: [], tag: [], text: [], inner_text: [], attributes: [], visible: [], box: [], selector: [], html: []};
+        for (const el of nodes) {
+            let id = el.getAttribute(stamp);
+            if (!id) {
+                id = String(++window.__automationSeq);
+                el.setAttribute(stamp, id);
+            }
+            const attrs = {};
+            for (const {name, value} of el.attributes) {
+                if (name !== stamp) attrs[name] = value;
+            }
+            const rect = el.getBoundingClientRect();
+            const visible = isVisible(el, rect, window.getComputedStyle(el));
+            out.id.push(id);
+            out.tag.push(el.tagName.toLowerCase());
+            out.text.push(el.textContent || "");
+            out.inner_text.push(el.innerText || "");
+            out.attributes.push(attrs);
+            out.visible.push(visible);
+            out.box.push(visible ? {x: rect.x, y: rect.y, width: rect.width, height: rect.height} : null);
+            out.selector.push(`[${stamp}="${id}"]`);
+            out.html.push(includeHtml ? el.innerHTML : null);
+        }
+        return out;
+    };
+"""
+
+_SNAPSHOT_SCRIPT = """
+([selector, stamp, includeHtml, prune]) => {
+""" + COLLECT_ROWS_JS + """
+    const INTERACTIVE_TAGS = new Set(['a', 'button', 'input', 'select', 'textarea', 'summary', 'option']);
+    const INTERACTIVE_ROLES = new Set(['button', 'link', 'checkbox', 'radio', 'menuitem', 'tab', 'switch',
+        'option', 'combobox', 'textbox', 'searchbox', 'slider', 'spinbutton', 'treeitem']);
+    const MEANINGFUL_TAGS = new Set(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'label', 'img', 'th', 'legend']);
+
+    // Strong candidates are things a user can act on; weak ones only carry meaning.
+    const classify = (el, style) => {
+        const tag = el.tagName.toLowerCase();
+        const role = el.getAttribute('role');
+        if (INTERACTIVE_TAGS.has(tag) && !(tag === 'input' && el.type === 'hidden')) return 'interactive';
+        if (role && INTERACTIVE_ROLES.has(role)) return 'interactive';
+        if (el.isContentEditable) return 'interactive';
+        const tabindex = el.getAttribute('tabindex');
+        if (tabindex !== null && Number(tabindex) >= 0) return 'interactive';
+        if (el.onclick || el.hasAttribute('onclick') || el.hasAttribute('onmousedown')) return 'clickable';
+        if (style.cursor === 'pointer' && !(el.parentElement && getComputedStyle(el.parentElement).cursor === 'pointer')) return 'clickable';
+        if (MEANINGFUL_TAGS.has(tag) || el.hasAttribute('aria-label') || el.hasAttribute('aria-labelledby')) return 'meaningful';
+        return null;
+    };
+
+    const pruneCandidates = () => {
+        const kept = new Map();
+        for (const el of document.body ? document.body.querySelectorAll('*') : []) {
+            const style = window.getComputedStyle(el);
+            const kind = classify(el, style);
+            if (!kind || !isVisible(el, el.getBoundingClientRect(), style)) continue;
+            // Anything inside an interactive control is part of that control; inside a
+            // clickable wrapper only nested controls are kept.
+            let ancestor = el.parentElement, inside = false;
+            while (ancestor) {
+                const k = kept.get(ancestor);
+                if (k === 'interactive' || (k === 'clickable' && kind !== 'interactive')) { inside = true; break; }
+                ancestor = ancestor.parentElement;
+            }
+            if (inside) continue;
+            kept.set(el, kind);
+        }
+        // Drop clickable wrappers that only wrap a single interactive control with the same text.
+        for (const [el, kind] of kept) {
+            if (kind !== 'clickable') continue;
+            const inner = Array.from(el.querySelectorAll('*')).filter(child => kept.get(child) === 'interactive');
+            if (inner.length === 1 && (inner[0].textContent || '').trim() === (el.textContent || '').trim()) kept.delete(el);
+        }
+        return Array.from(kept.keys());
+    };
+
+    return collectRows(prune ? pruneCandidates() : document.querySelectorAll(selector), stamp, includeHtml);
+}
+"""
+
+
+def stamp_selector(stamp_id: str) -> str:
+    """Returns the CSS selector for an element stamped with `stamp_id` by a snapshot."""
+    return f'[{SNAPSHOT_ATTRIBUTE}="{stamp_id}"]'
+
+
+@dataclass
+class DomSnapshot:
+    """Columnar view of the candidate elements on a page, one list per field."""
+
+    id: List[str] = field(default_factory=list)
+    tag: List[str] = field(default_factory=list)
+    text: List[str] = field(default_factory=list)
+    inner_text: List[str] = field(default_factory=list)
+    attributes: List[Dict[str, str]] = field(default_factory=list)
+    visible: List[bool] = field(default_factory=list)
+    box: List[Optional[Dict[str, float]]] = field(default_factory=list)
+    selector: List[str] = field(default_factory=list)
+    html: List[Optional[str]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.selector)
+
+    def locator(self, page: Page, index: int) -> Locator:
+        """Resolves the Playwright locator for a single snapshotted element."""
+        return page.locator(self.selector[index])
+
+
+async def snapshot_elements(page: Page, selector: str = INTERACTIVE_SELECTOR, include_html: bool = False) -> DomSnapshot:
+    """Collects tag, text, attributes, visibility and bounding box of every element
+    matching `selector` in a single round trip to the browser.
+
+    Args:
+        page: The Playwright Page object.
+        selector: CSS selector for the candidate elements.
+        include_html: Also collect each element's inner HTML (can be large).
+
+    Returns:
+        A DomSnapshot whose columns are aligned by element index.
+    """
+    with span("extract_candidates", selector=selector) as stage:
+        columns = await page.evaluate(_SNAPSHOT_SCRIPT, [selector, SNAPSHOT_ATTRIBUTE, include_html, False])
+        count("cdp_round_trips")
+        snapshot = DomSnapshot(**columns)
+        stage.set(elements=len(snapshot))
+    logger.debug(f"Snapshot collected {len(snapshot)} elements for '{selector}'")
+    return snapshot
+
+
+async def snapshot_candidates(page: Page, include_html: bool = False) -> DomSnapshot:
+    """Collects only the elements worth describing or matching, selected inside the page.
+
+    Keeps visible nodes that are interactive (native controls, interactive ARIA roles,
+    tabindex, contenteditable), clickable (inline handlers or a pointer cursor) or
+    semantically meaningful (headings, labels, images, aria-label). Descendants of a
+    kept control and wrappers around a single control are dropped, so a page of
+    thousands of nodes typically yields tens of candidates.
+
+    Args:
+        page: The Playwright Page object.
+        include_html: Also collect each element's inner HTML.
+
+    Returns:
+        A DomSnapshot of the pruned candidates, each with a stable selector.
+    """
+    with span("extract_candidates", selector="*", pruned=True) as stage:
+        columns = await page.evaluate(_SNAPSHOT_SCRIPT, ["*", SNAPSHOT_ATTRIBUTE, include_html, True])
+        count("cdp_round_trips")
+        snapshot = DomSnapshot(**columns)
+        stage.set(elements=len(snapshot))
+    logger.debug(f"Candidate pruning kept {len(snapshot)} elements")
+    return snapshot
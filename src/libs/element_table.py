@@ -0,0 +1,274 @@
+import gzip
+import json
+import math
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from playwright.async_api import Locator, Page
+
+from libs.dom_snapshot import INTERACTIVE_SELECTOR, DomSnapshot, snapshot_elements, stamp_selector
+
+TABLE_FORMAT_VERSION = 1
+
+_NO_BOX = (math.nan,) * 4
+
+
+def _intern(value: Optional[str]) -> str:
+    return sys.intern(value or "")
+
+
+class ElementRecord:
+    """One row of an ElementTable. Holds no page handles; `locator` resolves on demand."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "ElementTable", index: int):
+        self.table = table
+        self.index = index
+
+    @property
+    def id(self) -> str:
+        return self.table.ids[self.index]
+
+    @property
+    def tag(self) -> str:
+        return self.table.tags[self.index]
+
+    @property
+    def text(self) -> str:
+        return self.table.texts[self.index]
+
+    @property
+    def inner_text(self) -> str:
+        return self.table.inner_texts[self.index]
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        return self.table.attributes_of(self.index)
+
+    @property
+    def visible(self) -> bool:
+        return bool(self.table.visible[self.index])
+
+    @property
+    def box(self) -> Optional[Dict[str, float]]:
+        return self.table.box(self.index)
+
+    @property
+    def selector(self) -> str:
+        return stamp_selector(self.id)
+
+    def locator(self, page: Page) -> Locator:
+        return page.locator(self.selector)
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "tag": self.tag, "text": self.text, "inner_text": self.inner_text,
+                "attributes": self.attributes, "visible": self.visible, "box": self.box, "selector": self.selector}
+
+
+class ElementTable:
+    """Compact, array-backed table of page elements.
+
+    Tags, attribute names and attribute values are interned, so a page's
+    thousands of repeated class names and tags share one string each; visibility
+    and bounding boxes live in typed arrays. Embedding texts are built once per
+    row and reused by every query against the table; `upsert` and `remove` keep a
+    long-lived table (see PageIndex) current, rebuilding only the changed rows'
+    texts. Selectors are derived from the element's stamp only when asked for.
+    Tables can be written to and read from a gzipped JSON file with a shared
+    string table for offline replay.
+    """
+
+    __slots__ = ("ids", "tags", "texts", "inner_texts", "_attributes", "visible", "_boxes", "html", "url",
+                 "_embedding_texts", "_positions")
+
+    def __init__(self, url: str = ""):
+        self.ids: List[str] = []
+        self.tags: List[str] = []
+        self.texts: List[str] = []
+        self.inner_texts: List[str] = []
+        self._attributes: List[Tuple[str, ...]] = []  # flattened (name, value, name, value, ...)
+        self.visible = array("b")
+        self._boxes = array("d")  # x, y, width, height per row; NaN when hidden
+        self.html: Optional[List[Optional[str]]] = None
+        self.url = url
+        self._embedding_texts: Dict[str, List[Optional[str]]] = {}  # kind -> text per row, None until built
+        self._positions: Dict[str, int] = {}  # stamp id -> row
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[ElementRecord]:
+        return (ElementRecord(self, i) for i in range(len(self.ids)))
+
+    def __getitem__(self, index: int) -> ElementRecord:
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        return ElementRecord(self, index)
+
+    def append(self, stamp_id: str, tag: str, text: str, inner_text: str, attributes: Dict[str, str],
+               visible: bool, box: Optional[Dict[str, float]], html: Optional[str] = None):
+        self._positions[stamp_id] = len(self.ids)
+        self.ids.append(stamp_id)
+        self.tags.append(_intern(tag))
+        self.texts.append(text or "")
+        self.inner_texts.append(inner_text or "")
+        self._attributes.append(tuple(_intern(part) for pair in attributes.items() for part in pair))
+        self.visible.append(1 if visible else 0)
+        self._boxes.extend((box["x"], box["y"], box["width"], box["height"]) if box else _NO_BOX)
+        if html is not None and self.html is None:
+            self.html = [None] * (len(self.ids) - 1)
+        if self.html is not None:
+            self.html.append(html)
+        for texts in self._embedding_texts.values():
+            texts.append(None)
+
+    def _replace(self, index: int, tag: str, text: str, inner_text: str, attributes: Dict[str, str],
+                 visible: bool, box: Optional[Dict[str, float]], html: Optional[str] = None):
+        self.tags[index] = _intern(tag)
+        self.texts[index] = text or ""
+        self.inner_texts[index] = inner_text or ""
+        self._attributes[index] = tuple(_intern(part) for pair in attributes.items() for part in pair)
+        self.visible[index] = 1 if visible else 0
+        self._boxes[index * 4:index * 4 + 4] = array("d", (box["x"], box["y"], box["width"], box["height"])
+                                                      if box else _NO_BOX)
+        if html is not None and self.html is None:
+            self.html = [None] * len(self.ids)
+        if self.html is not None:
+            self.html[index] = html
+        for texts in self._embedding_texts.values():
+            texts[index] = None
+
+    def upsert(self, columns: Dict[str, List]):
+        """Applies snapshot rows (DomSnapshot columns): known stamps are updated in place, new ones appended."""
+        html = columns.get("html") or []
+        for i, stamp_id in enumerate(columns["id"]):
+            row = (columns["tag"][i], columns["text"][i], columns["inner_text"][i], columns["attributes"][i],
+                   columns["visible"][i], columns["box"][i], html[i] if i < len(html) else None)
+            index = self._positions.get(stamp_id)
+            if index is None:
+                self.append(stamp_id, *row)
+            else:
+                self._replace(index, *row)
+
+    def remove(self, stamp_ids: Iterable[str]):
+        """Drops the rows with these stamps; the remaining rows keep their order."""
+        drop = {self._positions[stamp_id] for stamp_id in stamp_ids if stamp_id in self._positions}
+        if not drop:
+            return
+        keep = [i for i in range(len(self.ids)) if i not in drop]
+        self.ids = [self.ids[i] for i in keep]
+        self.tags = [self.tags[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.inner_texts = [self.inner_texts[i] for i in keep]
+        self._attributes = [self._attributes[i] for i in keep]
+        self.visible = array("b", (self.visible[i] for i in keep))
+        self._boxes = array("d", (value for i in keep for value in self._boxes[i * 4:i * 4 + 4]))
+        if self.html is not None:
+            self.html = [self.html[i] for i in keep]
+        self._embedding_texts = {kind: [texts[i] for i in keep] for kind, texts in self._embedding_texts.items()}
+        self._positions = {stamp_id: i for i, stamp_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: DomSnapshot, url: str = "") -> "ElementTable":
+        table = cls(url)
+        table.upsert(vars(snapshot))
+        return table
+
+    def attributes_of(self, index: int) -> Dict[str, str]:
+        flat = self._attributes[index]
+        return dict(zip(flat[::2], flat[1::2]))
+
+    def attribute(self, index: int, name: str, default: str = "") -> str:
+        flat = self._attributes[index]
+        for i in range(0, len(flat), 2):
+            if flat[i] == name:
+                return flat[i + 1]
+        return default
+
+    def box(self, index: int) -> Optional[Dict[str, float]]:
+        x, y, width, height = self._boxes[index * 4:index * 4 + 4]
+        if math.isnan(x):
+            return None
+        return {"x": x, "y": y, "width": width, "height": height}
+
+    def selector(self, index: int) -> str:
+        return stamp_selector(self.ids[index])
+
+    def locator(self, page: Page, index: int) -> Locator:
+        """Resolves the Playwright locator for a single element."""
+        return page.locator(self.selector(index))
+
+    def embedding_text(self, index: int, kind: str = "link") -> str:
+        """Text embedded for one element.
+
+        "link": visible text and href, as map_intent_to_link ranks links.
+        "element": tag, text and attributes as JSON, as find_element_by_task ranks elements.
+        """
+        if kind == "link":
+            return f"{self.texts[index]} {self.attribute(index, 'href')}"
+        if kind == "element":
+            return json.dumps({"element_type": self.tags[index], "label": self.texts[index],
+                               "attributes": self.attributes_of(index)}, ensure_ascii=False)
+        raise ValueError(f"Unknown embedding text kind: {kind}")
+
+    def embedding_texts(self, kind: str = "link") -> List[str]:
+        """`embedding_text` for every row; each row's text is built once and kept until the row changes."""
+        texts = self._embedding_texts.get(kind)
+        if texts is None:
+            texts = self._embedding_texts[kind] = [None] * len(self.ids)
+        for i, text in enumerate(texts):
+            if text is None:
+                texts[i] = self.embedding_text(i, kind)
+        return texts
+
+    def save(self, path: str):
+        """Writes the table as gzipped JSON; strings repeated across rows are stored once."""
+        strings: Dict[str, int] = {}
+
+        def ref(value: Optional[str]) -> int:
+            if value is None:
+                return -1
+            return strings.setdefault(value, len(strings))
+
+        data = {
+            "version": TABLE_FORMAT_VERSION,
+            "url": self.url,
+            "ids": self.ids,
+            "tags": [ref(tag) for tag in self.tags],
+            "texts": [ref(text) for text in self.texts],
+            "inner_texts": [ref(text) for text in self.inner_texts],
+            "attributes": [[ref(part) for part in flat] for flat in self._attributes],
+            "visible": list(self.visible),
+            "boxes": [None if math.isnan(value) else value for value in self._boxes],
+            "html": [ref(html) for html in self.html] if self.html is not None else None,
+        }
+        data["strings"] = list(strings)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "ElementTable":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported element table version in {path}: {data.get('version')}")
+        strings = [sys.intern(value) for value in data["strings"]]
+        table = cls(data.get("url", ""))
+        table.ids = data["ids"]
+        table._positions = {stamp_id: i for i, stamp_id in enumerate(table.ids)}
+        table.tags = [strings[i] for i in data["tags"]]
+        table.texts = [strings[i] for i in data["texts"]]
+        table.inner_texts = [strings[i] for i in data["inner_texts"]]
+        table._attributes = [tuple(strings[i] for i in flat) for flat in data["attributes"]]
+        table.visible = array("b", data["visible"])
+        table._boxes = array("d", (math.nan if value is None else value for value in data["boxes"]))
+        if data.get("html") is not None:
+            table.html = [strings[i] if i >= 0 else None for i in data["html"]]
+        return table
+
+
+async def snapshot_table(page: Page, selector: str = INTERACTIVE_SELECTOR, include_html: bool = False) -> ElementTable:
+    """Snapshots `page` in one round trip straight into an ElementTable; the columnar snapshot is not kept."""
+    return ElementTable.from_snapshot(await snapshot_elements(page, selector, include_html=include_html), page.url)
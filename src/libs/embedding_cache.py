@@ -0,0 +1,276 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "automation", "embeddings")
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so cosmetic DOM differences map to the same cache entry."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache for one model.
+
+    Lookups go to an in-process LRU first and then to an on-disk store made of a
+    memory-mapped float32 matrix (one row per entry) and a SQLite index mapping
+    entry keys to rows. Each batch of new entries is one small transaction, not a
+    rewrite of the whole index, and SQLite's write lock serializes the processes
+    sharing a store while they allocate rows or create the matrix. When the store
+    is full the least recently used row is overwritten.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None, memory_size: int = 4096, max_entries: int = 50000):
+        self.model_name = model_name
+        self.cache_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._touched: Dict[str, float] = {}  # key -> last disk hit, written with the next batch or on close
+        self._conn: Optional[sqlite3.Connection] = None
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self._matrix_path = os.path.join(self.cache_dir, f"{slug}.f32")
+        self._index_path = os.path.join(self.cache_dir, f"{slug}.index.sqlite3")
+        self._legacy_index_path = os.path.join(self.cache_dir, f"{slug}.index.json")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _connect(self, create: bool) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            if not create and not (os.path.exists(self._index_path) or os.path.exists(self._legacy_index_path)):
+                return None
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self._index_path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                         " key TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn = conn
+            self._import_legacy_index()
+        return self._conn
+
+    def _import_legacy_index(self):
+        """Moves a JSON index written by earlier versions into SQLite; the matrix file is unchanged."""
+        if not os.path.exists(self._legacy_index_path):
+            return
+        try:
+            with open(self._legacy_index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._meta():
+                    self._conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?)",
+                                           [("dim", data["dim"]), ("capacity", data["capacity"])])
+                    self._conn.executemany("INSERT OR IGNORE INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+                                           [(key, row, i) for i, (key, row) in enumerate(data["rows"])])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            os.remove(self._legacy_index_path)
+        except Exception as e:
+            logger.error(f"Discarding unreadable embedding cache index {self._legacy_index_path}: {e}")
+
+    def _meta(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+
+    def _open_matrix(self, meta: Dict[str, int], create: bool) -> bool:
+        """Maps the matrix described by `meta`; with `create`, the caller holds the write lock."""
+        if self._matrix is None:
+            if "dim" not in meta:
+                return False
+            shape = (meta["capacity"], meta["dim"])
+            if os.path.exists(self._matrix_path):
+                self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=shape)
+            elif create:
+                self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="w+", shape=shape)
+            else:
+                return False
+            self.max_entries = meta["capacity"]
+        return True
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Returns the cached embedding for each text, or None where it is missing."""
+        with self._lock:
+            results: List[Optional[np.ndarray]] = [None] * len(texts)
+            pending: Dict[str, List[int]] = {}
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            conn = self._connect(create=False) if pending else None
+            if conn is not None and self._open_matrix(self._meta(), create=False):
+                keys = list(pending)
+                now = time.time()
+                # Writers overwrite matrix rows before they commit, so a row is read under the same write
+                # lock they take: no other process can evict it and reuse it between lookup and read.
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                        chunk = keys[start:start + 500]
+                        rows = conn.execute(
+                            f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                        ).fetchall()
+                        for key, row in rows:
+                            vector = np.array(self._matrix[row])
+                            self._remember(key, vector)
+                            self._touched[key] = now
+                            for i in pending[key]:
+                                results[i] = vector
+                finally:
+                    conn.execute("COMMIT")
+
+            for vector in results:
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Stores embeddings for texts and persists them to the disk store in one transaction."""
+        if len(texts) == 0:
+            return
+        entries = OrderedDict((self.key(text), np.asarray(vector, dtype=np.float32))
+                              for text, vector in zip(texts, vectors))
+        with self._lock:
+            conn = self._connect(create=True)
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")  # Serializes row allocation and matrix creation across processes
+            try:
+                meta = self._meta()
+                if "dim" not in meta:
+                    meta = {"dim": vectors.shape[1], "capacity": self.max_entries}
+                    conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?)", list(meta.items()))
+                if meta["dim"] != vectors.shape[1]:
+                    raise ValueError(f"Embedding cache for {self.model_name} holds {meta['dim']}-d vectors,"
+                                     f" got {vectors.shape[1]}-d")
+                self._open_matrix(meta, create=True)
+
+                self._touched.update(dict.fromkeys(entries, now))
+                conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(last_used, key) for key, last_used in self._touched.items()])
+                self._touched.clear()
+
+                keys = list(entries)
+                existing = {}
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    existing.update(conn.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+                new_keys = [key for key in keys if key not in existing][-self.max_entries:]
+                (used,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+                free = list(range(used, min(self.max_entries, used + len(new_keys))))
+                needed = len(new_keys) - len(free)
+                evicted = []
+                if needed > 0:
+                    # Least recently used first, rows touched in this same tick included; keys of this
+                    # batch are skipped, so over-fetch by their number.
+                    evicted = [(key, row) for key, row in conn.execute(
+                        "SELECT key, row FROM entries ORDER BY last_used, row LIMIT ?", (needed + len(existing),)
+                    ) if key not in entries][:needed]
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                for key, _ in evicted:
+                    self._memory.pop(key, None)
+                self.evictions += len(evicted)
+
+                rows = free + [row for _, row in evicted]
+                new_keys = new_keys[:len(rows)]
+                conn.executemany("INSERT INTO entries (key, row, last_used) VALUES (?, ?, ?)",
+                                 [(key, row, now) for key, row in zip(new_keys, rows)])
+                existing.update(zip(new_keys, rows))
+                for key, vector in entries.items():
+                    if key in existing:
+                        self._matrix[existing[key]] = vector
+                self._matrix.flush()  # Rows are on disk before other processes can look them up
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            for key, vector in entries.items():
+                self._remember(key, vector)
+
+    def close(self):
+        """Writes pending last-used times and releases the index; the cache reopens on next use."""
+        with self._lock:
+            if self._conn is None:
+                return
+            if self._touched:
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                       [(last_used, key) for key, last_used in self._touched.items()])
+                self._touched.clear()
+            self._conn.close()
+            self._conn = None
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            conn = self._connect(create=False)
+            disk_entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] if conn is not None else 0
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+        }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Returns the process-wide cache for a model, so all matchers share one disk store."""
+    with _caches_lock:
+        if not _caches:
+            atexit.register(close_embedding_caches)
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def close_embedding_caches():
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from libs.embedding_cache import EmbeddingCache, normalize_text
+from libs.embedding_service import EmbeddingService, get_embedding_service
+
+logger = logging.getLogger(__name__)
+
+
+async def encode_texts_async(model_name: str, texts: List[str], cache: Optional[EmbeddingCache] = None,
+                             service: Optional[EmbeddingService] = None) -> np.ndarray:
+    """Encodes texts as L2-normalized float32 rows, sending only cache misses to the model.
+
+    Misses are encoded by the embedding service, so the event loop keeps running and
+    concurrent callers share micro-batches."""
+    texts = [normalize_text(text) for text in texts]
+    cached = cache.get_many(texts) if cache is not None else [None] * len(texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        fresh = await (service or get_embedding_service()).encode(model_name, missing_texts)
+        if cache is not None:
+            # The disk write is a SQLite transaction plus a memmap flush; keep it off the event loop
+            await asyncio.to_thread(cache.put_many, missing_texts, fresh)
+        for i, vector in zip(missing, fresh):
+            cached[i] = vector
+    return np.stack(cached)
+
+
+async def rank_texts_async(model_name: str, query: str, texts: List[str], top_k: int = 5,
+                           cache: Optional[EmbeddingCache] = None, candidates: Optional[List[int]] = None) -> List[Dict]:
+    """Ranks candidate texts against a query by cosine similarity.
+
+    The query and every candidate are encoded in a single batch by the shared
+    embedding service and scored with one matrix-vector product.
+
+    Args:
+        model_name: Sentence transformer (or backend spec) to encode with.
+        query: The user's intent or task.
+        texts: Text representation of each candidate element.
+        top_k: Number of results to return.
+        cache: Optional embedding cache consulted before the model.
+        candidates: Optional positions in `texts` to score; the rest are skipped.
+
+    Returns:
+        Up to `top_k` dictionaries with "index" (position in `texts`) and "score",
+        best first.
+    """
+    if candidates is None:
+        candidates = list(range(len(texts)))
+    if not candidates:
+        return []
+
+    embeddings = await encode_texts_async(model_name, [query] + [texts[i] for i in candidates], cache=cache)
+    return _ranked(embeddings, candidates, top_k)
+
+
+def _ranked(embeddings: np.ndarray, candidates: List[int], top_k: int) -> List[Dict]:
+    """Scores candidate rows against the query row (row 0) and maps results back to `candidates`."""
+    ranked = top_k_scores(embeddings[1:] @ embeddings[0], top_k)
+    for result in ranked:
+        result["index"] = candidates[result["index"]]
+    return ranked
+
+
+def top_k_scores(scores: np.ndarray, top_k: int) -> List[Dict]:
+    """Returns the `top_k` highest scores as {"index", "score"} dictionaries, best first."""
+    k = min(top_k, len(scores))
+    if k == 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [{"index": int(i), "score": float(scores[i])} for i in top]
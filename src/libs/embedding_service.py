@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from libs.instrumentation import count, span
+from libs.model_registry import get_model
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(model_name: str, texts: List[str], batch_size: int) -> np.ndarray:
+    """Runs in the worker thread or process: one batched, normalized encode."""
+    embeddings = get_model(model_name).encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                              normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+class EmbeddingService:
+    """Encodes text off the asyncio event loop and micro-batches concurrent requests.
+
+    Requests arriving within `max_wait` seconds of each other (up to `max_batch`
+    texts) are merged into one `encode` call per model, run in a worker thread or,
+    with mode="process", in a worker process. Playwright traffic for other pages
+    keeps flowing while the model runs.
+    """
+
+    def __init__(self, mode: str = "thread", workers: int = 1, max_batch: int = 256, max_wait: float = 0.005,
+                 batch_size: int = 64):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown embedding service mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+
+        self.requests = 0
+        self.batches = 0
+
+        self._executor: Optional[Executor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+        if self._loop is not loop or self._batcher is None or self._batcher.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._batcher = loop.create_task(self._run_batcher())
+
+    async def encode(self, model_name: str, texts: List[str]) -> np.ndarray:
+        """Returns L2-normalized float32 embeddings for `texts`, one row per text."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        self._ensure_started()
+        self.requests += 1
+        future = self._loop.create_future()
+        await self._queue.put((model_name, list(texts), future))
+        return await future
+
+    async def _run_batcher(self):
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][1])
+            deadline = self._loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(request)
+                size += len(request[1])
+
+            by_model: Dict[str, List] = {}
+            for request in pending:
+                by_model.setdefault(request[0], []).append(request)
+            for model_name, requests in by_model.items():
+                # Not awaited here so the next micro-batch can be collected while this one encodes
+                task = self._loop.create_task(self._encode_batch(model_name, requests))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _encode_batch(self, model_name: str, requests: List):
+        texts = [text for _, request_texts, _ in requests for text in request_texts]
+        self.batches += 1
+        count("encode_batches")
+        count("encoded_texts", len(texts))
+        try:
+            with span("encode_batch", model=model_name, texts=len(texts), requests=len(requests)):
+                embeddings = await self._loop.run_in_executor(self._executor, _encode, model_name, texts,
+                                                              self.batch_size)
+        except Exception as e:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for _, request_texts, future in requests:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+        logger.debug(f"Encoded {len(texts)} texts from {len(requests)} requests in one batch")
+
+    def stats(self) -> Dict:
+        return {"mode": self.mode, "requests": self.requests, "batches": self.batches}
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Returns the process-wide embedding service shared by all matchers."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService()
+        return _service
@@ -0,0 +1,84 @@
+"""Inference backends for the sentence-transformer encoders.
+
+A model is named by a spec string, "<backend>:<model>", anywhere a model name is
+accepted (matchers, embedding cache, embedding service, --model flags):
+
+    all-mpnet-base-v2                  PyTorch, full precision (the default)
+    onnx:all-mpnet-base-v2             ONNX Runtime, fp32
+    onnx-int8:all-MiniLM-L6-v2         ONNX Runtime, dynamically quantized int8 weights
+
+Because the backend is part of the name, embeddings from different backends are
+cached and micro-batched separately. ONNX models are exported (and quantized) once
+into ENCODER_MODEL_DIR and reused on later runs; this needs
+`pip install "sentence-transformers[onnx]"` (ONNX Runtime and Optimum).
+"""
+
+import logging
+import os
+import platform
+import re
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "torch"
+DEFAULT_MODEL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "automation", "models")
+
+
+def parse_model_spec(spec: str) -> Tuple[str, str]:
+    """Splits "onnx-int8:all-MiniLM-L6-v2" into ("onnx-int8", "all-MiniLM-L6-v2")."""
+    backend, sep, model_name = spec.partition(":")
+    if sep and backend in BACKENDS:
+        return backend, model_name
+    return DEFAULT_BACKEND, spec
+
+
+def quantization_target() -> str:
+    """Picks the int8 kernel set ONNX Runtime should target on this CPU."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    flags = ""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        pass
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    if "avx512f" in flags:
+        return "avx512"
+    return "avx2"
+
+
+def _export_dir(model_name: str) -> str:
+    root = os.getenv("ENCODER_MODEL_DIR", DEFAULT_MODEL_DIR)
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+
+
+def load_encoder(spec: str) -> "SentenceTransformer":
+    """Loads the encoder named by `spec`; every backend exposes SentenceTransformer.encode."""
+    from sentence_transformers import SentenceTransformer  # Deferred: importing torch is slow
+
+    backend, model_name = parse_model_spec(spec)
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    export_dir = _export_dir(model_name)
+    if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+        logger.info(f"Exporting '{model_name}' to ONNX in {export_dir}")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(export_dir)
+    if backend == "onnx":
+        return SentenceTransformer(export_dir, backend="onnx")
+
+    target = quantization_target()
+    file_name = f"onnx/model_qint8_{target}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        logger.info(f"Quantizing '{model_name}' to int8 for {target}")
+        export_dynamic_quantized_onnx_model(SentenceTransformer(export_dir, backend="onnx"), target, export_dir)
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
@@ -1,36 +1,66 @@
-from sentence_transformers import SentenceTransformer, util
-import json
-from typing import Dict, List, Optional
+import logging
+from typing import Callable, Dict, List, Optional
 from playwright.async_api import async_playwright, BrowserContext, Page, Locator
 
-model = SentenceTransformer('all-mpnet-base-v2')  # Or a suitable model
+from libs.element_table import ElementTable, snapshot_table
+from libs.embedding_cache import EmbeddingCache, get_embedding_cache
+from libs.embedding_matcher import rank_texts_async
+from libs.instrumentation import span
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.page_index import PageIndex
 
-async def find_element_by_task(page: Page, task: str) -> Optional[Dict]:
-    interactive_elements = page.locator("a, button, input, [role='button']")
-    locators = await interactive_elements.all()
-    num_elements = len(locators)
-    if num_elements == 0:
-        return None
-
-    task_embedding = model.encode(task)
+logger = logging.getLogger(__name__)
 
-    for i, locator in enumerate(locators):
-        element_info = {
-            "unique_identifier": str(i),
-            "element_type": await locator.evaluate("el => el.tagName.toLowerCase()"),
-            "label": await locator.text_content() or "", # Get label, handle missing labels
-            "attributes": await locator.evaluate("el => {let attrs = {}; for (let {name, value} of el.attributes) {attrs[name] = value;} return attrs;}")
-        }
+# Cosine similarity an element must exceed for find_element_by_task to accept it (score > threshold).
+SIMILARITY_THRESHOLD = 0.2
 
-        element_text = json.dumps(element_info, ensure_ascii=False)  # Use all info as text
+async def find_element_by_task(page: Page, task: str, similarity_threshold: float = SIMILARITY_THRESHOLD,
+                               model_name: str = DEFAULT_MODEL_NAME, index: Optional[PageIndex] = None) -> Optional[Dict]:
+    with span("find_element_by_task", task=task) as stage:
+        if index is not None:
+            table = await index.refresh()  # Only re-extracts what changed since the last query
+        else:
+            table = await snapshot_table(page)  # One round trip for every candidate
 
-        element_embedding = model.encode(element_text)
-        similarity = util.cos_sim(task_embedding, element_embedding)
+        # Encoding runs off the event loop, so other pages keep moving meanwhile
+        ranker = index.rank if index is not None else rank_texts_async
+        element_info = await rank_elements(table, task, model_name=model_name, ranker=ranker,
+                                           cache=get_embedding_cache(model_name))
+        if element_info is None:
+            return None
 
-        print(f"similarity is '{similarity }'")
+        stage.set(similarity=element_info["similarity"], accepted=element_info["similarity"] > similarity_threshold)
+        logger.debug(f"Best element for '{task}' has similarity {element_info['similarity']:.3f}")
 
-        if similarity > 0.2:  # Adjust threshold as needed
-            element_info["locator"] = locator # add the locator info
+        if element_info["similarity"] > similarity_threshold:  # Adjust threshold as needed
+            element_info["locator"] = table.locator(page, element_info["index"])  # resolve the locator only for the match
             return element_info
 
-    return None
\ No newline at end of file
+        return None
+
+
+async def rank_elements(table: ElementTable, task: str, model_name: str = DEFAULT_MODEL_NAME,
+                        ranker: Optional[Callable] = None, cache: Optional[EmbeddingCache] = None) -> Optional[Dict]:
+    """Best element of the table for a task, whatever its similarity; no page needed, no locator returned."""
+    num_elements = len(table)
+    if num_elements == 0:
+        return None
+
+    element_texts = table.embedding_texts("element")  # Tag, label and attributes as text, built once
+
+    # Best element, not the first above threshold
+    ranker = ranker or rank_texts_async
+    with span("rank", matcher="find_element_by_task", candidates=num_elements) as stage:
+        ranked = await ranker(model_name, task, element_texts, top_k=1, cache=cache)
+        best = ranked[0]
+        stage.set(similarity=best["score"])
+
+    i = best["index"]
+    return {
+        "unique_identifier": str(i),
+        "element_type": table.tags[i],
+        "label": table.texts[i],
+        "attributes": table.attributes_of(i),
+        "similarity": best["score"],
+        "index": i,
+    }
@@ -0,0 +1,60 @@
+"""Static HTTP server for serving saved pages and assets from a directory, so
+browser features can be exercised offline.
+
+    python -m libs.fixture_server ../fixtures --port 8000
+"""
+
+import argparse
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Serves `directory` on a background thread; use as a context manager."""
+
+    def __init__(self, directory: str, host: str = "127.0.0.1", port: int = 0):
+        self.directory = directory
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a directory of saved pages over HTTP.")
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.directory, port=args.port)
+    print(f"Serving {args.directory} on {server.base_url}")
+    server._server.serve_forever()
@@ -0,0 +1,196 @@
+"""Spans and counters for finding where a task spends its time.
+
+Disabled by default: `span` returns a shared no-op and `count` returns at once,
+so instrumented code pays one global lookup per call. Enable it in code with
+`enable()`, or for any script with the AUTOMATION_TRACE environment variable:
+
+    AUTOMATION_TRACE=trace.json python main.py
+    AUTOMATION_TRACE=trace.json AUTOMATION_TRACE_FORMAT=chrome python automate2.py
+
+Chrome-format traces open in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV = "AUTOMATION_TRACE"
+TRACE_FORMAT_ENV = "AUTOMATION_TRACE_FORMAT"
+
+
+class _NoopSpan:
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed stage; extra details can be attached with `set` before it closes."""
+
+    __slots__ = ("tracer", "name", "args", "start", "track")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+        self.track = ""
+
+    def __enter__(self) -> "Span":
+        self.track = _current_track()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self, duration)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+def _current_track() -> str:
+    """Names the asyncio task (or thread) a span runs on, so concurrent work gets its own row."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+
+class Tracer:
+    """Collects finished spans and counter totals for one run."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.counters: Dict[str, float] = {}
+        self._counter_samples: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _record(self, span: Span, duration: float):
+        with self._lock:
+            self.spans.append({"name": span.name, "start": span.start - self.origin, "duration": duration,
+                               "track": span.track, "args": span.args})
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self._counter_samples.append({"name": name, "time": time.perf_counter() - self.origin,
+                                          "value": self.counters[name]})
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per-span-name call count and total, mean and max milliseconds."""
+        stages: Dict[str, Dict] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span["name"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["calls"] += 1
+            stage["total_ms"] += span["duration"] * 1000
+            stage["max_ms"] = max(stage["max_ms"], span["duration"] * 1000)
+        for stage in stages.values():
+            stage["mean_ms"] = stage["total_ms"] / stage["calls"]
+        return stages
+
+    def to_json(self) -> Dict:
+        return {"spans": self.spans, "counters": self.counters, "summary": self.summary()}
+
+    def to_chrome_trace(self) -> Dict:
+        """Trace Event Format: complete events for spans, counter events for counters."""
+        pid = os.getpid()
+        tracks: Dict[str, int] = {}
+        events = []
+        for span in self.spans:
+            tid = tracks.setdefault(span["track"], len(tracks) + 1)
+            events.append({"name": span["name"], "ph": "X", "pid": pid, "tid": tid,
+                           "ts": span["start"] * 1e6, "dur": span["duration"] * 1e6, "args": span["args"]})
+        for sample in self._counter_samples:
+            events.append({"name": sample["name"], "ph": "C", "pid": pid, "tid": 0,
+                           "ts": sample["time"] * 1e6, "args": {"value": sample["value"]}})
+        for track, tid in tracks.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str, format: str = "json"):
+        """Writes the trace to `path` as "json" (spans, counters, summary) or "chrome"."""
+        if format not in ("json", "chrome"):
+            raise ValueError(f"Unknown trace format: {format}")
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        logger.info(f"Trace with {len(self.spans)} spans written to {path}")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable() -> Tracer:
+    """Starts recording into a fresh tracer and returns it."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """Stops recording and returns the tracer that was active, if any."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, **args):
+    """Context manager timing one stage; a shared no-op while tracing is disabled."""
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+    return Span(tracer, name, args)
+
+
+def count(name: str, value: float = 1):
+    """Adds `value` to the counter `name` while tracing is enabled."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, value)
+
+
+def trace_from_env() -> Optional[Tracer]:
+    """Enables tracing when AUTOMATION_TRACE names an output file and writes it at exit.
+
+    AUTOMATION_TRACE_FORMAT selects "json" (default) or "chrome".
+    """
+    path = os.getenv(TRACE_ENV)
+    if not path:
+        return None
+    format = os.getenv(TRACE_FORMAT_ENV, "json")
+    tracer = enable()
+
+    def write():
+        tracer.export(path, format)
+        logger.info(f"Stage summary: {json.dumps(tracer.summary())}")
+        logger.info(f"Counters: {tracer.counters}")
+
+    atexit.register(write)
+    return tracer
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+from playwright.async_api import Page
+
+from libs.dom_snapshot import COLLECT_ROWS_JS, INTERACTIVE_SELECTOR, SNAPSHOT_ATTRIBUTE
+from libs.element_table import ElementTable
+from libs.embedding_cache import get_embedding_cache
+from libs.embedding_matcher import encode_texts_async
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "automation", "intents.sqlite3")
+
+# Matches are memoized only well above map_intent_to_link's 0.4 acceptance threshold: a
+# memoized answer is replayed without retrieval, so a borderline one would stick.
+MEMO_MIN_SIMILARITY = 0.6
+
+# Entries older than this are dropped and re-resolved, so a site redesign can't pin an old answer.
+MEMO_MAX_AGE = 7 * 24 * 3600
+
+# Attributes that, with tag and text, identify the element an intent resolved to.
+_TARGET_ATTRIBUTES = ("href", "id", "name", "aria-label", "value", "type")
+
+# Finds the first visible element matching a stored target and returns its snapshot row.
+_RESOLVE_SCRIPT = """
+([selector, stamp, target]) => {
+""" + COLLECT_ROWS_JS + """
+    const norm = s => (s || '').replace(/\\s+/g, ' ').trim();
+    for (const el of document.querySelectorAll(selector)) {
+        if (el.tagName.toLowerCase() !== target.tag || norm(el.textContent) !== target.text) continue;
+        if (Object.entries(target.attributes).some(([name, value]) => el.getAttribute(name) !== value)) continue;
+        if (!isVisible(el, el.getBoundingClientRect(), window.getComputedStyle(el))) continue;
+        const rows = collectRows([el], stamp, false);
+        return Object.fromEntries(Object.entries(rows).map(([column, values]) => [column, values[0]]));
+    }
+    return null;
+}
+"""
+
+
+def normalize_intent(intent: str) -> str:
+    """Lowercases and strips punctuation so "Log out!" and "log out" share an entry."""
+    return " ".join(re.sub(r"[^\w\s]", " ", intent.lower()).split())
+
+
+def url_pattern(url: str) -> str:
+    """Host, path with numbers wildcarded, and sorted query keys, e.g.
+    "parabank.parasoft.com/parabank/activity.htm?id" for any account id."""
+    parsed = urlparse(url)
+    path = re.sub(r"\d+", "*", parsed.path or "/")
+    keys = sorted({key for key, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    return f"{parsed.hostname or ''}{path}" + (f"?{'&'.join(keys)}" if keys else "")
+
+
+def element_target(table: ElementTable, index: int) -> Dict:
+    """What identifies an element on a later visit, independent of its stamp."""
+    return {
+        "tag": table.tags[index],
+        "text": " ".join(table.texts[index].split()),
+        "attributes": {name: table.attribute(index, name) for name in _TARGET_ATTRIBUTES
+                       if table.attribute(index, name)},
+    }
+
+
+class IntentIndex:
+    """Persistent memo of intents already resolved on a site, keyed by URL pattern.
+
+    Each entry stores the normalized intent, its embedding, the element it
+    resolved to and the match's similarity; only matches scoring at least
+    `min_similarity` are stored. `lookup` checks that element is still on the page
+    with a single DOM query; an exact intent match needs no model call. A paraphrase
+    whose embedding is within `similarity_threshold` of a stored intent reuses its
+    entry only if the element also scores `min_similarity` against the paraphrase.
+    Entries whose element no longer resolves, or older than `max_age` seconds, are
+    dropped, so the caller falls back to full retrieval and records the new answer
+    with `remember`.
+    """
+
+    def __init__(self, path: Optional[str] = None, similarity_threshold: float = 0.9,
+                 selector: str = INTERACTIVE_SELECTOR, min_similarity: float = MEMO_MIN_SIMILARITY,
+                 max_age: Optional[float] = MEMO_MAX_AGE):
+        self.path = path or os.getenv("INTENT_INDEX_PATH", DEFAULT_INDEX_PATH)
+        self.similarity_threshold = similarity_threshold
+        self.selector = selector
+        self.min_similarity = min_similarity
+        self.max_age = max_age
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.rejected = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS intents ("
+            " pattern TEXT NOT NULL, intent TEXT NOT NULL, model TEXT NOT NULL, embedding BLOB,"
+            " target TEXT NOT NULL, similarity REAL NOT NULL, uses INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (pattern, intent))"
+        )
+        self._conn.commit()
+
+    def _entries(self, pattern: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT intent, model, embedding, target, similarity, created_at FROM intents WHERE pattern = ?",
+                (pattern,)
+            ).fetchall()
+        return [{"intent": row[0], "model": row[1], "embedding": row[2], "target": json.loads(row[3]),
+                 "similarity": row[4], "created_at": row[5]} for row in rows]
+
+    def _valid(self, pattern: str, entries: List[Dict]) -> List[Dict]:
+        """Drops expired entries, and skips ones stored under a lower confidence bar."""
+        valid = []
+        now = time.time()
+        for entry in entries:
+            if self.max_age is not None and now - entry["created_at"] > self.max_age:
+                self.expired += 1
+                self.forget(pattern, entry["intent"])
+            elif entry["similarity"] >= self.min_similarity:
+                valid.append(entry)
+        return valid
+
+    async def lookup(self, page: Page, intent: str, model_name: Optional[str] = None) -> Optional[Dict]:
+        """Returns a verified match for `intent` on the current page, or None.
+
+        The result has the same keys as map_intent_to_link's, plus "memoized": True.
+        """
+        pattern = url_pattern(page.url)
+        key = normalize_intent(intent)
+        with span("intent_index_lookup", pattern=pattern) as stage:
+            entries = self._valid(pattern, self._entries(pattern))
+            entry = next((e for e in entries if e["intent"] == key), None)
+            similarity = query = None
+            if entry is None and model_name is not None:
+                same_model = [e for e in entries if e["model"] == model_name and e["embedding"] is not None]
+                if same_model:
+                    # The raw intent, so the full retrieval that may follow reuses this embedding
+                    query = (await encode_texts_async(model_name, [intent], cache=get_embedding_cache(model_name)))[0]
+                    stored = np.stack([np.frombuffer(e["embedding"], dtype=np.float32) for e in same_model])
+                    scores = stored @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        entry, similarity = same_model[best], float(scores[best])
+            if entry is None:
+                self.misses += 1
+                stage.set(result="miss")
+                return None
+
+            row = await page.evaluate(_RESOLVE_SCRIPT, [self.selector, SNAPSHOT_ATTRIBUTE, entry["target"]])
+            count("cdp_round_trips")
+            if row is None:
+                self.stale += 1
+                self.forget(pattern, entry["intent"])
+                logger.info(f"Memoized target for '{entry['intent']}' on {pattern} no longer resolves")
+                stage.set(result="stale")
+                return None
+
+            score = entry["similarity"]
+            if similarity is not None:
+                # A paraphrase borrows another intent's answer: check the element fits this wording too
+                text = f"{row['text']} {row['attributes'].get('href', '')}"  # As map_intent_to_link embeds it
+                element = (await encode_texts_async(model_name, [text], cache=get_embedding_cache(model_name)))[0]
+                score = float(element @ query)
+                if score < self.min_similarity:
+                    self.rejected += 1
+                    stage.set(result="rejected", intent_similarity=similarity, similarity=score)
+                    return None
+
+            self._touch(pattern, entry["intent"])
+            if similarity is None:
+                self.hits += 1
+                stage.set(result="hit")
+            else:
+                self.semantic_hits += 1
+                stage.set(result="semantic_hit", intent_similarity=similarity)
+
+        explanation = f"memoized from '{entry['intent']}' on {pattern}"
+        if similarity is not None:
+            explanation += f" (intent similarity {similarity:.3f})"
+        return {
+            "label": row["text"],
+            "href": row["attributes"].get("href", ""),
+            "selector": row["selector"],
+            "similarity": score,
+            "index": None,
+            "candidates": [],
+            "lexical_score": None,
+            "explanation": explanation,
+            "memoized": True,
+            "locator": page.locator(row["selector"]),
+        }
+
+    async def remember(self, url: str, intent: str, target: Dict, similarity: float, model_name: str) -> bool:
+        """Records what `intent` resolved to on `url` if the match is confident enough.
+
+        The intent embedding comes from the embedding cache.
+
+        Returns:
+            Whether the match was stored.
+        """
+        if similarity < self.min_similarity:
+            logger.debug(f"Not memoizing '{intent}': similarity {similarity:.3f} < {self.min_similarity}")
+            return False
+        key = normalize_intent(intent)
+        embedding = (await encode_texts_async(model_name, [intent], cache=get_embedding_cache(model_name)))[0]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intents (pattern, intent, model, embedding, target, similarity, uses,"
+                " created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (url_pattern(url), key, model_name, np.asarray(embedding, dtype=np.float32).tobytes(),
+                 json.dumps(target), float(similarity), now, now),
+            )
+            self._conn.commit()
+        return True
+
+    def _touch(self, pattern: str, intent: str):
+        with self._lock:
+            self._conn.execute("UPDATE intents SET uses = uses + 1, last_used = ? WHERE pattern = ? AND intent = ?",
+                               (time.time(), pattern, intent))
+            self._conn.commit()
+
+    def forget(self, pattern: str, intent: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM intents WHERE pattern = ? AND intent = ?", (pattern, intent))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.semantic_hits + self.misses + self.stale + self.rejected
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM intents").fetchone()
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_index: Optional[IntentIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_intent_index() -> IntentIndex:
+    """Returns the process-wide intent index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = IntentIndex()
+        return _index
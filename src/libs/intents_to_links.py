@@ -1,75 +1,180 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
-from sentence_transformers import SentenceTransformer, util
 from playwright.async_api import Page
 
+from libs.embedding_cache import EmbeddingCache, get_embedding_cache
+from libs.element_table import ElementTable, snapshot_table
+from libs.embedding_matcher import rank_texts_async
+from libs.instrumentation import span
+from libs.intent_index import IntentIndex, element_target
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.lexical_index import LexicalIndex
+from libs.page_index import PageIndex
+
 logging.getLogger('sentence_transformers').setLevel(logging.ERROR)  # Suppress INFO and DEBUG messages
 
 # Configure logging (if not already configured globally)
-logging.basicConfig(level=logging.error)
+logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-# Load a suitable sentence transformer model
-model = SentenceTransformer('all-mpnet-base-v2')  # Or try 'multi-qa-mpnet-base-dot-v1' or 'all-MiniLM-L6-v2'
+# Cosine similarity a link needs for map_intent_to_link to accept it (score >= threshold).
+SIMILARITY_THRESHOLD = 0.4
+
+# Best lexical score below which the prefilter is skipped and every link is reranked. One
+# shared word already scores at least 0.5; below 0.25 only scattered trigrams match.
+LEXICAL_FLOOR = 0.25
 
 
-async def map_intent_to_link(page: Page, user_intent: str, similarity_threshold: float = 0.4) -> Optional[Dict]:
+async def map_intent_to_link(page: Page, user_intent: str, similarity_threshold: float = SIMILARITY_THRESHOLD, top_k: int = 5,
+                             model_name: str = DEFAULT_MODEL_NAME, index: Optional[PageIndex] = None,
+                             prefilter_top_n: Optional[int] = 20,
+                             intent_index: Optional[IntentIndex] = None) -> Optional[Dict]:
     """Maps a user intent to a clickable link on the page.
 
     Args:
         page: The Playwright Page object.
         user_intent: The user's intent as a string.
         similarity_threshold: The minimum cosine similarity for a match.
+        top_k: Number of ranked candidates to keep in the result.
+        model_name: Sentence transformer to use, e.g. 'all-MiniLM-L6-v2' or 'onnx-int8:all-MiniLM-L6-v2' for
+            low-latency paths.
+        index: Optional incremental page index; only elements changed since the last query are
+            re-extracted and re-embedded.
+        prefilter_top_n: How many candidates the lexical (BM25/trigram) stage passes on to the
+            embedding reranker. None scores every element with embeddings, as does a query whose
+            best lexical score is below LEXICAL_FLOOR.
+        intent_index: Optional memo of intents resolved earlier on this site; a verified hit
+            returns after one DOM query without running retrieval.
 
     Returns:
         A dictionary containing information about the best matching link (or None if no match is found).
-        The dictionary will include "label", "href" (if available), "locator", and other info.
+        The dictionary will include "label", "href" (if available), "locator", the top-k "candidates"
+        with their scores, the "lexical_score", an "explanation" of the choice, and other info.
     """
 
-    try:
-        links = await page.locator("a, button, input, [role='button']").all()  # Get all links on the page
-        num_links = len(links)
-
-        if num_links == 0:
+    with span("map_intent_to_link", intent=user_intent):
+        try:
+            if intent_index is not None:
+                memoized = await intent_index.lookup(page, user_intent, model_name=model_name)
+                if memoized is not None:
+                    return memoized
+
+            if index is not None:
+                table = await index.refresh()  # The index's own table, updated in place
+            else:
+                table = await snapshot_table(page)  # Get all links on the page in one round trip
+            if len(table) == 0:
+                return None
+
+            ranker = index.rank if index is not None else rank_texts_async
+            best_match = await rank_links(table, user_intent, top_k=top_k, model_name=model_name, ranker=ranker,
+                                          cache=get_embedding_cache(model_name), prefilter_top_n=prefilter_top_n)
+
+            if best_match is not None and best_match["similarity"] >= similarity_threshold:
+                best_match["locator"] = page.locator(best_match["selector"])  # Resolve only the winner for clicking
+                if intent_index is not None:
+                    await intent_index.remember(page.url, user_intent, element_target(table, best_match["index"]),
+                                                best_match["similarity"], model_name)
+                return best_match
+            else:
+                return None  # No match found above the threshold
+
+        except Exception as e:
+            logger.error(f"Error mapping intent to link: {e}")
             return None
 
-        best_match = None
-        highest_similarity = 0
-
-        intent_embedding = model.encode(user_intent)
 
-        for i, link_locator in enumerate(links):
-            link_text = await link_locator.text_content() or ""
-            href = await link_locator.get_attribute("href") or ""
+async def rank_links(table: ElementTable, user_intent: str, top_k: int = 5, model_name: str = DEFAULT_MODEL_NAME,
+                     ranker: Optional[Callable] = None, cache: Optional[EmbeddingCache] = None,
+                     prefilter_top_n: Optional[int] = 20) -> Optional[Dict]:
+    """Ranks the links of an element table against an intent, without a page.
 
-            # Create a combined text representation for the link, including text and href
-            link_representation = f"{link_text} {href}" # Combine link text and href
+    This is the retrieval half of map_intent_to_link; it returns the best link
+    whatever its similarity, so callers (and offline replays) apply the threshold.
 
-            link_embedding = model.encode(link_representation)
-            similarity = util.cos_sim(intent_embedding, link_embedding)[0][0] # Extract similarity value
-
-
-            # logger.info(f"Similarity between intent '{user_intent}' and link '{link_text}': {similarity}")
-            logger.info(f"Similarity check: '{link_text}': {similarity}")
+    Args:
+        table: Elements to rank, e.g. from a live snapshot or a saved capture.
+        user_intent: The user's intent as a string.
+        top_k: Number of ranked candidates to keep in the result.
+        model_name: Sentence transformer (or backend spec) to embed with.
+        ranker: Ranking function with the rank_texts_async signature; defaults to it.
+        cache: Optional embedding cache.
+        prefilter_top_n: How many candidates the lexical stage passes on to the reranker.
 
-            if similarity > highest_similarity:
-                highest_similarity = similarity
-                best_match = {
-                    "label": link_text,
-                    "href": href,
-                    "locator": link_locator,  # Store the locator for easy clicking later
-                    "similarity": similarity,
-                    "index": i # Store the index
+    Returns:
+        The best match without a "locator", or None for an empty table.
+    """
+    num_links = len(table)
+    if num_links == 0:
+        return None
+    ranker = ranker or rank_texts_async
+
+    link_texts = table.texts
+    # Combined text representation for each link, including text and href
+    link_representations = table.embedding_texts("link")
+
+    # Stage 1: cheap lexical prefilter over text, href, aria-label and name
+    lexical = {}
+    candidates = None
+    if prefilter_top_n:
+        with span("lexical_prefilter", elements=num_links):
+            lexical_index = LexicalIndex([
+                {
+                    "text": link_texts[i],
+                    "href": table.attribute(i, "href"),
+                    "aria_label": table.attribute(i, "aria-label"),
+                    "name": table.attribute(i, "name"),
                 }
-
-        if best_match and best_match["similarity"] >= similarity_threshold:
-            return best_match
-        else:
-            return None  # No match found above the threshold
-
-    except Exception as e:
-        logger.error(f"Error mapping intent to link: {e}")
+                for i in range(num_links)
+            ])
+            lexical = {result["index"]: result for result in lexical_index.search(user_intent, prefilter_top_n)}
+            best_lexical = next(iter(lexical.values()), None)
+            if best_lexical is not None and best_lexical["score"] >= LEXICAL_FLOOR:
+                candidates = list(lexical)
+            else:
+                # No real word overlap (a paraphrase like "sign me up" for "Register"): the lexical
+                # top-N would be arbitrary, so let the embeddings see every link
+                logger.info(f"Lexical prefilter skipped for '{user_intent}': best score "
+                            f"{best_lexical['score'] if best_lexical else 0.0:.2f} < {LEXICAL_FLOOR}")
+
+    # Stage 2: embedding rerank of the prefiltered candidates only, encoded off the event loop
+    num_reranked = len(candidates) if candidates is not None else num_links
+    with span("rank", matcher="map_intent_to_link", candidates=num_reranked) as stage:
+        ranked = await ranker(model_name, user_intent, link_representations, top_k=top_k,
+                              cache=cache, candidates=candidates)
+        stage.set(similarity=ranked[0]["score"] if ranked else None)
+
+    for result in ranked:
+        if result["index"] in lexical:
+            result["lexical_score"] = lexical[result["index"]]["score"]
+        logger.info(f"Similarity check: '{link_texts[result['index']]}': {result['score']}")
+
+    if not ranked:
         return None
+    best = ranked[0]
+    return {
+        "label": link_texts[best["index"]],
+        "href": table.attribute(best["index"], "href"),
+        "selector": table.selector(best["index"]),
+        "similarity": best["score"],
+        "index": best["index"], # Store the index
+        "candidates": ranked,
+        "lexical_score": lexical.get(best["index"], {}).get("score"),
+        "explanation": _explain(link_texts[best["index"]], best, lexical, num_links, num_reranked),
+    }
+
+
+def _explain(label: str, best: Dict, lexical: Dict[int, Dict], num_links: int, num_reranked: int) -> str:
+    """Human-readable account of why a link was chosen."""
+    parts = [f"'{' '.join(label.split())}' has the highest semantic similarity ({best['score']:.3f})"
+             f" among {num_reranked} of {num_links} elements reranked"]
+    lexical_result = lexical.get(best["index"])
+    if lexical_result is not None:
+        rank = list(lexical).index(best["index"]) + 1
+        terms = ", ".join(lexical_result["matched_terms"]) or "none"
+        parts.append(f"lexical rank {rank} (bm25 {lexical_result['bm25']:.2f}, trigram {lexical_result['trigram']:.2f},"
+                     f" matched terms: {terms})")
+    return "; ".join(parts)
@@ -0,0 +1,94 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; URLs split on punctuation so 'openaccount.htm' yields 'openaccount', 'htm'."""
+    return _TOKEN_PATTERN.findall((text or "").lower())
+
+
+def trigrams(text: str) -> set:
+    normalized = f" {' '.join(tokenize(text))} "
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+
+class LexicalIndex:
+    """In-memory BM25 plus character-trigram index over element fields.
+
+    BM25 rewards exact word overlap; trigram overlap catches fuzzy and partial
+    matches ('acount' vs 'account', 'openaccount' vs 'open account'). Both are
+    combined into one score in [0, 1] for cheap prefiltering before embeddings.
+    """
+
+    def __init__(self, documents: List[Dict[str, str]], k1: float = 1.5, b: float = 0.75, trigram_weight: float = 0.5):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.trigram_weight = trigram_weight
+
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)  # term -> [(doc, tf)]
+        self._trigram_postings: Dict[str, List[int]] = defaultdict(list)  # trigram -> [doc]
+        self._lengths: List[int] = []
+        self._trigram_counts: List[int] = []
+
+        for doc_id, fields in enumerate(documents):
+            text = " ".join(value for value in fields.values() if value)
+            tokens = tokenize(text)
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self._postings[term].append((doc_id, tf))
+            grams = trigrams(text)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigram_postings[gram].append(doc_id)
+
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.documents) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_n: int = 20) -> List[Dict]:
+        """Returns up to `top_n` documents that share a word or trigram with the query, best first.
+
+        Documents scoring 0 are never returned, so a query with no overlap yields fewer
+        results (or none) rather than an arbitrary top-N. Each result has "index", "score" (combined), "bm25", "trigram" (Dice
+        coefficient) and "matched_terms".
+        """
+        if not self.documents:
+            return []
+
+        bm25 = defaultdict(float)
+        matched = defaultdict(list)
+        for term in set(tokenize(query)):
+            idf = self._idf(term)
+            for doc_id, tf in self._postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self._lengths[doc_id] / (self._avg_length or 1)
+                bm25[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+                matched[doc_id].append(term)
+
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            for doc_id in self._trigram_postings.get(gram, ()):
+                shared[doc_id] += 1
+
+        max_bm25 = max(bm25.values(), default=0.0) or 1.0
+        results = []
+        for doc_id in set(bm25) | set(shared):
+            dice = 2 * shared[doc_id] / ((len(query_grams) + self._trigram_counts[doc_id]) or 1)
+            score = (1 - self.trigram_weight) * bm25[doc_id] / max_bm25 + self.trigram_weight * dice
+            if score <= 0:
+                continue
+            results.append({"index": doc_id, "score": score, "bm25": bm25[doc_id], "trigram": dice,
+                            "matched_terms": sorted(matched[doc_id])})
+
+        results.sort(key=lambda result: (-result["score"], result["index"]))
+        return results[:top_n]
@@ -0,0 +1,368 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, RateLimitError
+
+from libs.description_cache import DescriptionCache
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_MODEL = "gpt-3.5-turbo"
+DEFAULT_BATCH_TOKEN_BUDGET = 3000
+
+DESCRIBE_SYSTEM_PROMPT = "You are a helpful assistant describing HTML elements."
+DESCRIBE_INSTRUCTION = "Describe the functionality of the following HTML element."
+
+BATCH_FORMAT_INSTRUCTION = """Each element below is given as an object with an "id" and its "html".
+Respond with only a JSON array containing one object per element, in the form
+{"id": "<element id>", "description": "<description>"}. Do not add any other text."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) used for packing batches."""
+    return len(text) // 4 + 1
+
+
+def element_prompt(instruction: str, element_html: str) -> str:
+    """Builds the single-element prompt for an instruction and an HTML snippet."""
+    return f"{instruction}\n\n```html\n{element_html}\n```"
+
+
+def retry_delay(error: BaseException, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a failed request, or None if retrying cannot help.
+
+    Timeouts, connection errors, 429s and 5xx responses are retried, honouring the
+    server's Retry-After; other API errors (bad request, auth, content policy) are not.
+    """
+    if isinstance(error, APIStatusError):
+        if not isinstance(error, RateLimitError) and error.status_code < 500:
+            return None
+        headers = error.response.headers if error.response is not None else {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            pass  # An HTTP date; fall back to exponential backoff
+    elif not isinstance(error, (APIConnectionError, asyncio.TimeoutError)):  # APITimeoutError is a connection error
+        return None
+    return (2 ** attempt) * 0.5 + random.uniform(0, 0.25)
+
+
+def pack_batches(snippets: Dict[str, str], token_budget: int) -> List[Dict[str, str]]:
+    """Greedily packs snippets into batches whose estimated size stays under `token_budget`.
+
+    A snippet larger than the budget on its own gets a batch to itself.
+    """
+    batches = []
+    current: Dict[str, str] = {}
+    used = 0
+    for element_id, snippet in snippets.items():
+        cost = estimate_tokens(element_id) + estimate_tokens(snippet) + 8  # JSON punctuation overhead
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = {}, 0
+        current[element_id] = snippet
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(text: str) -> Dict[str, str]:
+    """Parses a JSON array of {"id", "description"} objects, tolerating a Markdown code fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    data = json.loads(text)
+    if isinstance(data, dict):
+        if "id" in data and "description" in data:
+            data = [data]  # A batch of one answered with a bare object
+        else:
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) == 1:
+                data = lists[0]  # The array wrapped in an object, e.g. {"descriptions": [...]}
+            else:
+                return {str(k): str(v).strip() for k, v in data.items() if isinstance(v, str)}
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array, got {type(data).__name__}")
+    return {str(item["id"]): str(item["description"]).strip() for item in data
+            if isinstance(item, dict) and "id" in item and "description" in item}
+
+
+class TokenBucket:
+    """Async token bucket: allows `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DescriptionPipeline:
+    """Runs chat completions concurrently with a concurrency cap, rate limiting,
+    per-request timeouts and retry with exponential backoff.
+
+    Point `base_url` (or the OPENAI_BASE_URL environment variable) at a local stub
+    server to exercise the pipeline without calling OpenAI. With a `cache`, responses
+    are reused across runs for as long as the prompt template version and the
+    described content stay the same.
+    """
+
+    def __init__(self, client: Optional[AsyncOpenAI] = None, model: str = DEFAULT_LLM_MODEL, concurrency: int = 8,
+                 requests_per_second: float = 5.0, max_retries: int = 3, timeout: float = 30.0,
+                 api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cache: Optional[DescriptionCache] = None, template_version: str = "1"):
+        # Retries happen here, through the rate limiter, so the SDK's own retries are turned off
+        self.client = (client or AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"),
+                                             base_url=base_url or os.getenv("OPENAI_BASE_URL"))).with_options(max_retries=0)
+        self.model = model
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.cache = cache
+        self.template_version = template_version
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket = TokenBucket(requests_per_second)
+
+    async def complete(self, messages: List[Dict], use_cache: bool = True) -> str:
+        """Sends one chat completion and returns the stripped response text."""
+        content = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if use_cache and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, self.model, self.template_version, content)
+            if cached is not None:
+                count("llm_cache_hits")
+                return cached
+
+        response = await self._request(messages)
+        if use_cache and self.cache is not None:
+            await asyncio.to_thread(self.cache.put, self.model, self.template_version, content, response,
+                                    estimate_tokens(content) + estimate_tokens(response))
+        return response
+
+    async def stream(self, messages: List[Dict], use_cache: bool = True) -> AsyncIterator[str]:
+        """Like `complete`, but yields the response text as it arrives.
+
+        A cached response is yielded in one piece; a streamed one is cached once complete.
+        """
+        content = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if use_cache and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, self.model, self.template_version, content)
+            if cached is not None:
+                count("llm_cache_hits")
+                yield cached
+                return
+
+        parts = []
+        async for piece in self._stream_request(messages):
+            parts.append(piece)
+            yield piece
+        if use_cache and self.cache is not None:
+            response = "".join(parts).strip()
+            await asyncio.to_thread(self.cache.put, self.model, self.template_version, content, response,
+                                    estimate_tokens(content) + estimate_tokens(response))
+
+    def _ensure_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:  # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _stream_request(self, messages: List[Dict]) -> AsyncIterator[str]:
+        async with self._ensure_semaphore():
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                received = 0
+                try:
+                    with span("llm_request", model=self.model, attempt=attempt, stream=True) as stage:
+                        count("llm_requests")
+                        started = time.perf_counter()
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(model=self.model, messages=messages, stream=True),
+                            timeout=self.timeout,
+                        )
+                        chunks = response.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            piece = chunk.choices[0].delta.content if chunk.choices else None
+                            if not piece:
+                                continue
+                            if not received:
+                                stage.set(first_token_ms=(time.perf_counter() - started) * 1000)
+                            received += len(piece)
+                            yield piece
+                        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+                        completion_tokens = received // 4 + 1
+                        count("llm_prompt_tokens", prompt_tokens)
+                        count("llm_completion_tokens", completion_tokens)
+                        stage.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                    return
+                except Exception as e:
+                    # Text already handed to the caller cannot be taken back, so only retry before it
+                    delay = retry_delay(e, attempt)
+                    if received or delay is None or attempt == self.max_retries:
+                        raise
+                    logger.warning(f"OpenAI streaming request failed ({e}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    async def _request(self, messages: List[Dict]) -> str:
+        async with self._ensure_semaphore():
+            for attempt in range(self.max_retries + 1):
+                await self._bucket.acquire()
+                try:
+                    with span("llm_request", model=self.model, attempt=attempt) as stage:
+                        count("llm_requests")
+                        response = await asyncio.wait_for(
+                            self.client.chat.completions.create(model=self.model, messages=messages),
+                            timeout=self.timeout,
+                        )
+                        text = response.choices[0].message.content.strip()
+                        usage = getattr(response, "usage", None)
+                        prompt_tokens = getattr(usage, "prompt_tokens", None) or sum(
+                            estimate_tokens(message["content"]) for message in messages)
+                        completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(text)
+                        count("llm_prompt_tokens", prompt_tokens)
+                        count("llm_completion_tokens", completion_tokens)
+                        stage.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                    return text
+                except Exception as e:
+                    delay = retry_delay(e, attempt)
+                    if delay is None or attempt == self.max_retries:
+                        raise
+                    logger.warning(f"OpenAI request failed ({e}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    async def describe(self, prompts: Dict[str, str], system_prompt: str,
+                       error_text: str = "Error with OpenAI API", use_cache: bool = True) -> Dict[str, str]:
+        """Describes every prompt concurrently.
+
+        Args:
+            prompts: User prompt per element id.
+            system_prompt: System message shared by every request.
+            error_text: Description recorded for elements whose request fails.
+            use_cache: Look up and store each prompt's response in the cache.
+
+        Returns:
+            A dictionary of element id to description, in the order of `prompts`.
+        """
+
+        async def run(element_id: str, prompt: str) -> str:
+            try:
+                return await self.complete([
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ], use_cache=use_cache)
+            except Exception as e:
+                logger.error(f"OpenAI API error for {element_id}: {e}")
+                return error_text
+
+        ids = list(prompts)
+        descriptions = await asyncio.gather(*(run(element_id, prompts[element_id]) for element_id in ids))
+        return dict(zip(ids, descriptions))
+
+    async def describe_batched(self, snippets: Dict[str, str], instruction: str, system_prompt: str,
+                               token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                               error_text: str = "Error with OpenAI API") -> Dict[str, str]:
+        """Describes many elements with a few requests by packing several snippets per prompt.
+
+        The model answers each batch with a JSON array keyed by element id. Elements
+        missing from a response, or whose batch failed to parse, are described with
+        individual requests instead. A batch whose request itself failed (after the
+        pipeline's retries) is not fanned out: its elements get `error_text`.
+
+        Args:
+            snippets: HTML snippet per element id.
+            instruction: What to describe about each element.
+            system_prompt: System message shared by every request.
+            token_budget: Estimated prompt tokens allowed per batch, instruction excluded.
+            error_text: Description recorded for elements whose request fails.
+
+        Returns:
+            A dictionary of element id to description, in the order of `snippets`.
+        """
+
+        async def run(batch: Dict[str, str]) -> Dict[str, str]:
+            items = [{"id": element_id, "html": snippet} for element_id, snippet in batch.items()]
+            prompt = f"{instruction}\n\n{BATCH_FORMAT_INSTRUCTION}\n\n{json.dumps(items, ensure_ascii=False)}"
+            try:
+                response = await self.complete([
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ], use_cache=False)  # Batches are cached per element below, not as a whole
+            except Exception as e:
+                # Splitting the batch would multiply requests exactly when the API is pushing back
+                logger.error(f"Batch of {len(batch)} elements failed: {e}")
+                failed.update(batch)
+                return {}
+            try:
+                return parse_batch_response(response)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Unparseable response for a batch of {len(batch)} elements ({e}),"
+                               f" falling back to single requests")
+                return {}
+
+        def element_content(snippet: str) -> str:
+            return f"{system_prompt}\n{instruction}\n{snippet}"
+
+        results: Dict[str, str] = {}
+        failed: Dict[str, str] = {}
+        if self.cache is not None:
+            ids = list(snippets)
+            contents = [element_content(snippets[element_id]) for element_id in ids]
+            cached = await asyncio.to_thread(self.cache.get_many, self.model, self.template_version, contents)
+            results.update((element_id, description) for element_id, description in zip(ids, cached)
+                           if description is not None)
+
+        described: Dict[str, str] = {}  # Fresh descriptions, written to the cache in one transaction
+        pending = {element_id: snippet for element_id, snippet in snippets.items() if element_id not in results}
+        batches = pack_batches(pending, token_budget)
+        for parsed in await asyncio.gather(*(run(batch) for batch in batches)):
+            for element_id, description in parsed.items():
+                if element_id in pending and element_id not in results:
+                    results[element_id] = described[element_id] = description
+        for element_id in failed:
+            results[element_id] = error_text
+
+        missing = {element_id: element_prompt(instruction, snippet)
+                   for element_id, snippet in snippets.items() if element_id not in results}
+        if missing:
+            logger.info(f"Describing {len(missing)} of {len(snippets)} elements individually")
+            # Already looked up above; the single-request prompts are stored under the element's key below
+            singles = await self.describe(missing, system_prompt, error_text=error_text, use_cache=False)
+            for element_id, description in singles.items():
+                results[element_id] = description
+                if description != error_text:
+                    described[element_id] = description
+
+        if self.cache is not None and described:
+            entries = [(element_content(snippets[element_id]), description,
+                        estimate_tokens(snippets[element_id]) + estimate_tokens(description))
+                       for element_id, description in described.items()]
+            await asyncio.to_thread(self.cache.put_many, self.model, self.template_version, entries)
+
+        logger.info(f"Described {len(snippets)} elements with {len(batches)} batched requests"
+                    f" ({len(snippets) - len(pending)} from cache)")
+        return {element_id: results[element_id] for element_id in snippets}
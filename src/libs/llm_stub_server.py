@@ -0,0 +1,131 @@
+"""Minimal OpenAI-compatible chat completions server for exercising the LLM
+pipeline offline.
+
+    python -m libs.llm_stub_server --port 8765 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python automate2.py
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+def default_responder(messages: List[Dict]) -> str:
+    """Echoes the start of the last user message back as the description.
+
+    Batched description prompts (a JSON array of {"id", "html"} items at the end)
+    are answered with a JSON array of {"id", "description"} objects.
+    """
+    last = messages[-1]["content"] if messages else ""
+    if last.rstrip().endswith("]") and '"id"' in last:
+        try:
+            items = json.loads(last[last.rindex("\n\n") + 2:])
+            return json.dumps([{"id": item["id"], "description": f"Stub description: {' '.join(item['html'].split())[:80]}"}
+                               for item in items])
+        except (ValueError, KeyError, TypeError):
+            pass
+    return f"Stub description: {' '.join(last.split())[:80]}"
+
+
+class StubServer:
+    """Serves /v1/chat/completions on a background thread with a fixed latency.
+
+    Requests with "stream": true get server-sent events, one word per chunk,
+    `token_delay` seconds apart.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 responder: Optional[Callable[[List[Dict]], str]] = None, token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.responder = responder or default_responder
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                content = stub.responder(body.get("messages", []))
+                if body.get("stream"):
+                    self._stream(body, content)
+                    return
+                payload = json.dumps({
+                    "id": f"stub-{stub.requests}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body: Dict, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = content.split(" ")
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": f"stub-{stub.requests}",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"content": word if i == 0 else f" {word}"}}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if stub.token_delay:
+                        time.sleep(stub.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI chat completions server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per request")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed words")
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency=args.latency, token_delay=args.token_delay)
+    print(f"Stub LLM server listening on {server.base_url}")
+    server._server.serve_forever()
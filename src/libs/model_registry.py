@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict
+
+from libs.encoder_backends import load_encoder, parse_model_spec
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = 'all-mpnet-base-v2'
+FAST_MODEL_NAME = 'all-MiniLM-L6-v2'  # Smaller model for low-latency paths
+
+_models: Dict[str, "SentenceTransformer"] = {}
+_metrics: Dict[str, Dict] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_model(model_name: str = DEFAULT_MODEL_NAME) -> "SentenceTransformer":
+    """Returns the process-wide SentenceTransformer for `model_name`, loading it on first use.
+
+    `model_name` may carry a backend prefix, e.g. "onnx-int8:all-MiniLM-L6-v2"
+    (see libs.encoder_backends).
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        _metrics[model_name]["uses"] += 1
+        return model
+
+    with _registry_lock:
+        lock = _locks.setdefault(model_name, threading.Lock())
+
+    with lock:  # Only one caller loads a given model, the rest wait for it
+        if model_name not in _models:
+            logging.getLogger('sentence_transformers').setLevel(logging.ERROR)
+            started = time.perf_counter()
+            model = load_encoder(model_name)
+            load_seconds = time.perf_counter() - started
+            _metrics[model_name] = {"backend": parse_model_spec(model_name)[0], "load_seconds": load_seconds,
+                                    "loaded_at": time.time(), "uses": 0}
+            _models[model_name] = model
+            logger.info(f"Loaded model '{model_name}' in {load_seconds:.2f}s")
+        _metrics[model_name]["uses"] += 1
+        return _models[model_name]
+
+
+def load_metrics() -> Dict[str, Dict]:
+    """Returns backend, load time, load timestamp and use count for every loaded model."""
+    return {name: dict(values) for name, values in _metrics.items()}
@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Page, Request, Route
+
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ASSET_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "automation", "assets")
+
+
+@dataclass
+class NetworkPolicy:
+    """What a browser context may download and how navigations wait.
+
+    Args:
+        blocked_resource_types: Playwright resource types to abort, e.g. "image", "font", "media".
+        blocked_domains: Hosts (and their subdomains) whose requests are aborted.
+        cache_dir: Directory for serving repeated static assets from disk; None disables it.
+        cached_resource_types: Resource types eligible for the disk cache.
+        har_path: Optional HAR file replayed before the network; misses fall through.
+        wait_until: Load state navigations wait for: "domcontentloaded", "load" or "networkidle".
+    """
+
+    blocked_resource_types: Set[str] = field(default_factory=lambda: {"image", "font", "media"})
+    blocked_domains: List[str] = field(default_factory=list)
+    cache_dir: Optional[str] = DEFAULT_ASSET_CACHE_DIR
+    cached_resource_types: Set[str] = field(default_factory=lambda: {"stylesheet", "script"})
+    har_path: Optional[str] = None
+    wait_until: str = "domcontentloaded"
+
+
+# Describe the original transfer, not the decoded body the cache stores and replays.
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+# Freshness guessed from Last-Modified when a response gives no explicit lifetime (RFC 9111 4.2.2).
+_HEURISTIC_FRESHNESS_CAP = 24 * 3600
+
+
+def _cache_control(headers: Dict[str, str]) -> Dict[str, str]:
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Dict[str, str], now: float) -> Optional[float]:
+    """Seconds a response may be served from the asset cache without revalidation.
+
+    Returns None when it must not be stored: Cache-Control no-store or private, a
+    Set-Cookie, or a Vary on anything but Accept-Encoding. The cache is keyed by URL
+    alone and shared by every context, so it only holds responses any user may get.
+    """
+    directives = _cache_control(headers)
+    if "no-store" in directives or "private" in directives or "set-cookie" in headers:
+        return None
+    vary = {value.strip().lower() for value in headers.get("vary", "").split(",") if value.strip()}
+    if vary - {"accept-encoding"}:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0.0, float(directives[name]))
+            except ValueError:
+                return 0.0
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        return max(0.0, expires - (_http_date(headers.get("date")) or now))
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(_HEURISTIC_FRESHNESS_CAP, max(0.0, (now - last_modified) * 0.1))
+    return 0.0
+
+
+def _validators(headers: Dict[str, str]) -> Dict[str, str]:
+    """Conditional request headers that revalidate a stored response."""
+    validators = {}
+    if headers.get("etag"):
+        validators["if-none-match"] = headers["etag"]
+    if headers.get("last-modified"):
+        validators["if-modified-since"] = headers["last-modified"]
+    return validators
+
+
+def _read_entry(path: str) -> Optional[Tuple[Dict, bytes]]:
+    """Reads a cache entry: one line of JSON metadata followed by the body."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        header, _, body = data.partition(b"\n")
+        return json.loads(header), body
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable asset cache entry {path}: {e}")
+        return None
+
+
+def _write_entry(path: str, meta: Dict, body: bytes):
+    """Writes metadata and body as one file and renames it into place, so concurrent
+    readers (other contexts, other processes) see the old entry or the new one, never half."""
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(meta).encode("utf-8") + b"\n")
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write asset cache entry {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class NetworkMonitor:
+    """Route handler enforcing a NetworkPolicy on a context and counting what it saved.
+
+    Static assets are cached on disk per URL for as long as their Cache-Control,
+    Expires or Last-Modified allow, then revalidated with If-None-Match /
+    If-Modified-Since. `bytes_saved` and `seconds_saved` are measured on cache hits
+    only; blocked requests are counted but never downloaded, so their size is unknown.
+    """
+
+    def __init__(self, policy: NetworkPolicy):
+        self.policy = policy
+        self.requests = 0
+        self.blocked = 0
+        self.cache_hits = 0
+        self.revalidations = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        if policy.cache_dir:
+            os.makedirs(policy.cache_dir, exist_ok=True)
+
+    def _is_blocked(self, request: Request) -> bool:
+        if request.resource_type in self.policy.blocked_resource_types:
+            return True
+        host = urlparse(request.url).hostname or ""
+        return any(host == domain or host.endswith(f".{domain}") for domain in self.policy.blocked_domains)
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.policy.cache_dir, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.entry")
+
+    async def handle(self, route: Route):
+        request = route.request
+        self.requests += 1
+
+        if self._is_blocked(request):
+            self.blocked += 1
+            await route.abort()
+            return
+
+        if not (self.policy.cache_dir and request.method == "GET"
+                and request.resource_type in self.policy.cached_resource_types):
+            await route.continue_()
+            return
+
+        try:
+            await self._handle_cacheable(route, request)
+        except Exception as e:
+            # The route must still be resolved, or the request (and the navigation waiting on it) hangs.
+            logger.warning(f"Asset cache failed for {request.url}, sending it to the network: {e}")
+            try:
+                await route.continue_()
+            except Exception:
+                try:
+                    await route.abort()
+                except Exception:
+                    pass  # Already handled
+
+    async def _handle_cacheable(self, route: Route, request: Request):
+        headers = await request.all_headers()
+        if "cookie" in headers or "authorization" in headers:
+            # A credentialed response may be specific to this context's user; never share it.
+            await route.continue_()
+            return
+
+        path = self._cache_path(request.url)
+        entry = await asyncio.to_thread(_read_entry, path)
+        if entry is not None and time.time() < entry[0]["expires_at"]:
+            meta, body = entry
+            self.cache_hits += 1
+            self.bytes_saved += len(body)
+            self.seconds_saved += meta["fetch_seconds"]
+            await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            return
+
+        validators = _validators(entry[0]["headers"]) if entry is not None else {}
+        started = time.perf_counter()
+        if validators:
+            response = await route.fetch(headers={**request.headers, **validators})
+        else:
+            response = await route.fetch()
+        fetch_seconds = time.perf_counter() - started
+        now = time.time()
+
+        if validators and response.status == 304:
+            meta, body = entry
+            headers = {**meta["headers"], **{name: value for name, value in response.headers.items()
+                                             if name.lower() not in _TRANSFER_HEADERS}}
+            lifetime = freshness_lifetime(headers, now)
+            self.revalidations += 1
+            self.bytes_saved += len(body)
+            self.seconds_saved += max(0.0, meta["fetch_seconds"] - fetch_seconds)
+            if lifetime is not None:
+                await asyncio.to_thread(_write_entry, path, dict(meta, headers=headers, expires_at=now + lifetime), body)
+            await route.fulfill(status=meta["status"], headers=headers, body=body)
+            return
+
+        body = await response.body()
+        if response.status == 200:
+            lifetime = freshness_lifetime(response.headers, now)
+            if lifetime is not None and (lifetime > 0 or _validators(response.headers)):
+                headers = {name: value for name, value in response.headers.items()
+                           if name.lower() not in _TRANSFER_HEADERS}
+                meta = {"url": request.url, "status": response.status, "headers": headers,
+                        "fetch_seconds": fetch_seconds, "expires_at": now + lifetime}
+                await asyncio.to_thread(_write_entry, path, meta, body)
+        await route.fulfill(response=response, body=body)
+
+    def counters(self) -> Dict:
+        return {"requests": self.requests, "blocked": self.blocked, "cache_hits": self.cache_hits,
+                "revalidations": self.revalidations, "bytes_saved": self.bytes_saved,
+                "seconds_saved": self.seconds_saved}
+
+
+def interactive_policy(**kwargs) -> NetworkPolicy:
+    """Policy for headed, interactive scripts: nothing is blocked, static assets are still cached.
+
+    Blocking images would leave image-only links (logos, icon buttons) with no size, so
+    the snapshot would mark them invisible and the matchers and describers would never
+    see them. Headless batch runs opt into blocking explicitly.
+    """
+    kwargs.setdefault("blocked_resource_types", set())
+    return NetworkPolicy(**kwargs)
+
+
+async def apply_network_policy(context: BrowserContext, policy: Optional[NetworkPolicy] = None) -> NetworkMonitor:
+    """Installs `policy` on every page of `context` and returns the monitor counting its effect."""
+    monitor = NetworkMonitor(policy or NetworkPolicy())
+    await context.route("**/*", monitor.handle)
+    if monitor.policy.har_path:
+        # Registered last so it is consulted first; requests missing from the HAR fall through.
+        await context.route_from_har(monitor.policy.har_path, not_found="fallback")
+    return monitor
+
+
+async def navigate(page: Page, url: str, monitor: Optional[NetworkMonitor] = None, timeout: float = 30000) -> Dict:
+    """Navigates with the policy's wait strategy and reports what this navigation cost and saved."""
+    wait_until = monitor.policy.wait_until if monitor else "load"
+    before = monitor.counters() if monitor else {}
+    with span("navigation", url=url, wait_until=wait_until) as stage:
+        started = time.perf_counter()
+        await page.goto(url, wait_until=wait_until, timeout=timeout)
+        count("navigations")
+        report = {"url": url, "wait_until": wait_until, "seconds": time.perf_counter() - started}
+        if monitor:
+            after = monitor.counters()
+            report.update({key: after[key] - before[key] for key in after})
+        stage.set(**{key: value for key, value in report.items() if key not in ("url", "wait_until", "seconds")})
+    logger.info(f"Navigation report: {report}")
+    return report
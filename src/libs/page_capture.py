@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Page
+
+from libs.element_table import ElementTable, snapshot_table
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FORMAT_VERSION = 1
+
+META_FILE = "meta.json"
+ELEMENTS_FILE = "elements.json.gz"
+TEXT_FILE = "text.txt.gz"
+ACCESSIBILITY_FILE = "accessibility.yaml.gz"
+SCREENSHOT_FILE = "screenshot.jpg"
+
+
+def capture_name(url: str) -> str:
+    """Directory name for a capture of `url`: host and path, plus a short hash of the full URL."""
+    parsed = urlparse(url)
+    slug = re.sub(r"[^\w.-]+", "_", f"{parsed.hostname or 'page'}{parsed.path}").strip("_")[:80]
+    return f"{slug}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+
+
+@dataclass
+class PageCapture:
+    """A page saved for offline replay; its parts are read from disk only when asked for.
+
+    Args:
+        directory: Directory holding the capture's files.
+        name: Capture name, the directory's base name by default.
+        url: URL the page was captured from.
+        title: Document title at capture time.
+        captured_at: Unix time of the capture.
+        elements: Number of elements in the element table.
+    """
+
+    directory: str
+    name: str
+    url: str
+    title: str = ""
+    captured_at: float = 0.0
+    elements: int = 0
+
+    @classmethod
+    def load(cls, directory: str) -> "PageCapture":
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CAPTURE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported capture version in {directory}: {meta.get('version')}")
+        return cls(directory=directory, name=meta.get("name") or os.path.basename(os.path.normpath(directory)),
+                   url=meta.get("url", ""), title=meta.get("title", ""), captured_at=meta.get("captured_at", 0.0),
+                   elements=meta.get("elements", 0))
+
+    def table(self) -> ElementTable:
+        """The interactive elements, as map_intent_to_link and find_element_by_task extract them."""
+        return ElementTable.load(os.path.join(self.directory, ELEMENTS_FILE))
+
+    def text(self) -> str:
+        """The page's visible text (document.body.innerText)."""
+        return self._read_text(TEXT_FILE)
+
+    def accessibility(self) -> str:
+        """The accessibility tree as Playwright's ARIA snapshot (YAML); empty if it was not captured."""
+        return self._read_text(ACCESSIBILITY_FILE)
+
+    def screenshot_path(self) -> Optional[str]:
+        path = os.path.join(self.directory, SCREENSHOT_FILE)
+        return path if os.path.exists(path) else None
+
+    def _read_text(self, filename: str) -> str:
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            return ""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+
+def _write_text(path: str, text: str):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+
+
+async def capture_page(page: Page, root: str, name: Optional[str] = None, screenshot: bool = True,
+                       accessibility: bool = True) -> PageCapture:
+    """Saves what the matchers and describers read from `page` under `root/<name>`.
+
+    The element table (with each element's HTML, for the describers), the visible
+    text, the ARIA snapshot of the accessibility tree and a JPEG screenshot are
+    written next to a small meta.json; replaying them needs no browser. Files are
+    written to a hidden temporary directory, meta.json last, which then replaces
+    any earlier capture of the same name, so a reader sees a whole capture or none
+    and no file of an older capture is left behind.
+
+    Args:
+        page: The Playwright Page object, already navigated and settled.
+        root: Directory the capture directory is created in.
+        name: Capture name; derived from the URL by default.
+        screenshot: Also save a viewport screenshot.
+        accessibility: Also save the accessibility tree.
+
+    Returns:
+        The written capture.
+    """
+    name = name or capture_name(page.url)
+    directory = os.path.join(root, name)
+    staging = os.path.join(root, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+    os.makedirs(staging)
+    try:
+        capture = await _write_capture(page, staging, name, screenshot, accessibility)
+        _replace_directory(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    capture.directory = directory
+    return capture
+
+
+def _replace_directory(source: str, target: str):
+    """Moves `source` to `target`; an existing `target` is renamed aside first, then deleted."""
+    retired = None
+    if os.path.exists(target):
+        retired = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.{uuid.uuid4().hex[:8]}.old")
+        os.replace(target, retired)
+    os.replace(source, target)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+async def _write_capture(page: Page, directory: str, name: str, screenshot: bool, accessibility: bool) -> PageCapture:
+    with span("capture_page", url=page.url) as stage:
+        table = await snapshot_table(page, include_html=True)
+        table.save(os.path.join(directory, ELEMENTS_FILE))
+
+        text = await page.evaluate("() => document.body ? document.body.innerText : ''")
+        count("cdp_round_trips")
+        _write_text(os.path.join(directory, TEXT_FILE), text)
+
+        if accessibility:
+            try:
+                tree = await page.locator("body").aria_snapshot()
+                count("cdp_round_trips")
+                _write_text(os.path.join(directory, ACCESSIBILITY_FILE), tree)
+            except Exception as e:
+                logger.warning(f"Could not capture the accessibility tree of {page.url}: {e}")
+
+        if screenshot:
+            await page.screenshot(path=os.path.join(directory, SCREENSHOT_FILE), type="jpeg", quality=60)
+            count("cdp_round_trips")
+
+        capture = PageCapture(directory=directory, name=name, url=page.url, title=await page.title(),
+                              captured_at=time.time(), elements=len(table))
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"version": CAPTURE_FORMAT_VERSION, "name": capture.name, "url": capture.url,
+                       "title": capture.title, "captured_at": capture.captured_at, "elements": capture.elements,
+                       "text_chars": len(text)}, f, indent=2)
+        stage.set(elements=len(table), text_chars=len(text))
+    return capture
+
+
+def iter_captures(root: str) -> Iterator[PageCapture]:
+    """Yields every capture under `root`, in name order; directories without a meta.json are skipped,
+    as are the hidden directories of captures still being written or replaced."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(dirname for dirname in dirnames if not dirname.startswith("."))
+        if META_FILE in filenames:
+            dirnames.clear()  # Captures don't nest
+            try:
+                yield PageCapture.load(dirpath)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping capture {dirpath}: {e}")
@@ -0,0 +1,171 @@
+import logging
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from playwright.async_api import Page
+
+from libs.dom_snapshot import COLLECT_ROWS_JS, INTERACTIVE_SELECTOR, SNAPSHOT_ATTRIBUTE
+from libs.element_table import ElementTable, snapshot_table
+from libs.embedding_cache import EmbeddingCache
+from libs.embedding_matcher import encode_texts_async, top_k_scores
+from libs.instrumentation import count, span
+
+logger = logging.getLogger(__name__)
+
+_INSTALL_SCRIPT = """
+([selector, stamp]) => {
+    window.__automationIndex = window.__automationIndex || {};
+    if (window.__automationIndex[selector]) return false;
+    const state = {dirty: new Set(), removed: new Set(), selector, stamp};
+    // Stamped nodes are marked too: one that stopped matching the selector is then dropped by the delta.
+    const tracked = `${selector}, [${stamp}]`;
+    const markTree = (node) => {
+        if (node.nodeType !== Node.ELEMENT_NODE) return;
+        if (node.matches(tracked)) state.dirty.add(node);
+        for (const el of node.querySelectorAll(tracked)) state.dirty.add(el);
+    };
+    const markRemoved = (node) => {
+        if (node.nodeType !== Node.ELEMENT_NODE) return;
+        const id = node.getAttribute(stamp);
+        if (id) state.removed.add(id);
+        for (const el of node.querySelectorAll(`[${stamp}]`)) state.removed.add(el.getAttribute(stamp));
+    };
+    const owner = (node) => {
+        const el = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+        return el ? el.closest(selector) : null;
+    };
+    new MutationObserver(records => {
+        for (const record of records) {
+            if (record.type === 'childList') {
+                record.addedNodes.forEach(markTree);
+                record.removedNodes.forEach(markRemoved);
+                const el = owner(record.target);
+                if (el) state.dirty.add(el);
+            } else if (record.type === 'attributes') {
+                if (record.attributeName === stamp) continue;
+                // Class or style changes on a container can change visibility of everything below it.
+                markTree(record.target);
+            } else {
+                const el = owner(record.target);
+                if (el) state.dirty.add(el);
+            }
+        }
+    }).observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    window.__automationIndex[selector] = state;
+    return true;
+}
+"""
+
+_DELTA_SCRIPT = """
+([selector, includeHtml]) => {
+""" + COLLECT_ROWS_JS + """
+    const state = window.__automationIndex && window.__automationIndex[selector];
+    if (!state) return null;
+    const nodes = [];
+    const removed = new Set(state.removed);
+    for (const el of state.dirty) {
+        if (el.isConnected && el.matches(state.selector)) {
+            nodes.push(el);
+        } else {
+            const id = el.getAttribute(state.stamp);
+            if (id) removed.add(id);
+        }
+    }
+    state.dirty.clear();
+    state.removed.clear();
+    const rows = collectRows(nodes, state.stamp, includeHtml);
+    for (const id of rows.id) removed.delete(id);  // Moved rather than removed
+    return {removed: Array.from(removed), rows};
+}
+"""
+
+_MAX_EMBEDDED = 20000
+
+
+class PageIndex:
+    """Keeps the candidate elements of a page, and their embeddings, up to date
+    incrementally.
+
+    The first refresh takes a full snapshot into an ElementTable and installs a
+    MutationObserver in the page. Later refreshes only re-extract the elements the
+    observer saw added, removed or changed and apply them to the same table, so
+    its embedding texts are rebuilt only for those rows, and `rank` only re-encodes
+    texts it has not seen. A new document (after navigation) is detected and
+    triggers a full snapshot again.
+    """
+
+    def __init__(self, page: Page, selector: str = INTERACTIVE_SELECTOR, include_html: bool = False):
+        self.page = page
+        self.selector = selector
+        self.include_html = include_html
+        self.table = ElementTable()  # Rows in document order of first sighting
+        self._embedded: Dict[Tuple[str, str], np.ndarray] = {}  # (model, text) -> embedding
+        self.last_delta: Dict = {}
+
+    async def refresh(self) -> ElementTable:
+        """Brings the index up to date with the page and returns its element table.
+
+        The same table is returned on every refresh of a document and updated in place.
+        """
+        with span("index_refresh", selector=self.selector) as stage:
+            delta = await self.page.evaluate(_DELTA_SCRIPT, [self.selector, self.include_html])
+            count("cdp_round_trips")
+            if delta is None:
+                # New document, or first use: observe first so nothing between the two calls is missed.
+                await self.page.evaluate(_INSTALL_SCRIPT, [self.selector, SNAPSHOT_ATTRIBUTE])
+                count("cdp_round_trips")
+                self.table = await snapshot_table(self.page, self.selector, include_html=self.include_html)
+                self._embedded = {}
+                self.last_delta = {"reset": True, "added": len(self.table), "changed": 0, "removed": 0}
+            else:
+                before = len(self.table)
+                self.table.remove(delta["removed"])
+                removed = before - len(self.table)
+                rows = delta["rows"]
+                self.table.upsert(rows)
+                added = len(self.table) - (before - removed)
+                self.last_delta = {"reset": False, "added": added, "changed": len(rows["id"]) - added,
+                                   "removed": removed}
+            self.table.url = self.page.url
+            stage.set(**self.last_delta)
+        logger.info(f"Page index refreshed: {self.last_delta}")
+        return self.table
+
+    async def rank(self, model_name: str, query: str, texts: List[str], top_k: int = 5,
+                   cache: Optional[EmbeddingCache] = None, candidates: Optional[List[int]] = None) -> List[Dict]:
+        """Same contract as embedding_matcher.rank_texts_async for texts aligned with the
+        refreshed table, but only texts not embedded before on this document are encoded.
+
+        Embeddings are keyed by model and text, not by row or stamp: an element that moved,
+        was re-rendered under a new stamp, or is ranked by both matchers (whose texts differ)
+        never invalidates the rows around it.
+        """
+        if candidates is None:
+            candidates = list(range(len(texts)))
+        if not candidates:
+            return []
+        if len(self._embedded) > max(_MAX_EMBEDDED, 4 * len(texts)):
+            self._embedded = {}  # Long-lived single-page apps: start over rather than grow without bound
+        stale = list(dict.fromkeys(texts[i] for i in candidates if (model_name, texts[i]) not in self._embedded))
+        fresh = await encode_texts_async(model_name, [query] + stale, cache=cache)
+        for text, embedding in zip(stale, fresh[1:]):
+            self._embedded[(model_name, text)] = embedding
+        logger.debug(f"Encoded {len(stale)} new texts for {len(candidates)} of {len(texts)} indexed elements")
+
+        embeddings = np.stack([self._embedded[(model_name, texts[i])] for i in candidates])
+        ranked = top_k_scores(embeddings @ fresh[0], top_k)
+        for result in ranked:
+            result["index"] = candidates[result["index"]]
+        return ranked
+
+
+_indexes: "weakref.WeakKeyDictionary[Page, Dict[str, PageIndex]]" = weakref.WeakKeyDictionary()
+
+
+def get_page_index(page: Page, selector: str = INTERACTIVE_SELECTOR) -> PageIndex:
+    """Returns the index kept for `page` and `selector`, creating it on first use."""
+    by_selector = _indexes.setdefault(page, {})
+    if selector not in by_selector:
+        by_selector[selector] = PageIndex(page, selector)
+    return by_selector[selector]
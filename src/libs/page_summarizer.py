@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import uuid
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Union
+
+from playwright.async_api import Page
+
+from libs.instrumentation import count, span
+from libs.llm_pipeline import DescriptionPipeline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_CHARS = 4000
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant summarizing webpage content."
+
+SUMMARY_PROMPT = """Summarize the following text content of a webpage concisely.
+
+```
+{text}
+```"""
+
+MAP_PROMPT = """The following is part {part} of the text content of a long webpage.
+Summarize it concisely, keeping names, numbers and the actions a user can take.
+
+```
+{text}
+```"""
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of one webpage, in page order.
+Combine them into one concise summary of the whole page.
+
+{summaries}"""
+
+# The page's text is captured once per summary inside the page and handed out a
+# slice per call, cut at a line or word break, so Python only ever holds the
+# chunks currently being summarized.
+_TEXT_OPEN_SCRIPT = """
+(key) => {
+    window.__automationText = window.__automationText || {};
+    window.__automationText[key] = document.body ? document.body.innerText : '';
+    return window.__automationText[key].length;
+}
+"""
+
+_TEXT_CHUNK_SCRIPT = """
+([key, start, size]) => {
+    const text = (window.__automationText || {})[key] || '';
+    let end = Math.min(text.length, start + size);
+    if (end < text.length) {
+        // A break at end - 1 at the latest, so the chunk never exceeds `size`
+        const line = text.lastIndexOf('\\n', end - 1);
+        const word = text.lastIndexOf(' ', end - 1);
+        if (line > start + size / 2) end = line + 1;
+        else if (word > start + size / 2) end = word + 1;
+    }
+    return {text: text.slice(start, end), end};
+}
+"""
+
+_TEXT_CLOSE_SCRIPT = "(key) => { if (window.__automationText) delete window.__automationText[key]; }"
+
+
+async def iter_page_text(page: Page, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> AsyncIterator[str]:
+    """Yields the page's visible text in chunks of at most `chunk_chars`, one round trip each."""
+    key = uuid.uuid4().hex
+    length = await page.evaluate(_TEXT_OPEN_SCRIPT, key)
+    count("cdp_round_trips")
+    try:
+        start = 0
+        while start < length:
+            chunk = await page.evaluate(_TEXT_CHUNK_SCRIPT, [key, start, chunk_chars])
+            count("cdp_round_trips")
+            if chunk["end"] <= start:
+                # The stored text is gone (the page navigated) and would restart at 0 forever
+                logger.warning(f"Page text ended at {start} of {length} characters; the page likely navigated")
+                break
+            start = chunk["end"]
+            if chunk["text"].strip():
+                yield chunk["text"]
+    finally:
+        await page.evaluate(_TEXT_CLOSE_SCRIPT, key)
+
+
+def iter_text_chunks(text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS) -> Iterator[str]:
+    """Splits already captured text like iter_page_text does: at a line or word break past half a chunk."""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            line = text.rfind("\n", 0, end)
+            word = text.rfind(" ", 0, end)
+            if line > start + chunk_chars / 2:
+                end = line + 1
+            elif word > start + chunk_chars / 2:
+                end = word + 1
+        if text[start:end].strip():
+            yield text[start:end]
+        start = end
+
+
+async def _aiter(chunks: Iterable[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+def _messages(prompt: str) -> List[dict]:
+    return [{"role": "system", "content": SUMMARY_SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+def _group(summaries: List[str], max_chars: int) -> List[List[str]]:
+    """Splits summaries, in order, into groups whose combined length stays under `max_chars`."""
+    groups, current, used = [], [], 0
+    for summary in summaries:
+        if current and used + len(summary) > max_chars:
+            groups.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += len(summary)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _reduce_prompt(summaries: List[str]) -> str:
+    return REDUCE_PROMPT.format(summaries="\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries)))
+
+
+async def stream_page_summary(pipeline: DescriptionPipeline, page: Page, chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                              max_inflight: Optional[int] = None) -> AsyncIterator[str]:
+    """Summarizes the whole page with a chunked map-reduce and yields the summary as it streams.
+
+    See stream_text_summary; the page's text is read chunk by chunk with iter_page_text.
+    """
+    async for piece in stream_text_summary(pipeline, iter_page_text(page, chunk_chars), chunk_chars, max_inflight):
+        yield piece
+
+
+async def stream_text_summary(pipeline: DescriptionPipeline, chunks: Union[AsyncIterator[str], Iterable[str]],
+                              chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                              max_inflight: Optional[int] = None) -> AsyncIterator[str]:
+    """Summarizes text chunks with a map-reduce and yields the summary as it streams.
+
+    A page that fits in one chunk is summarized by a single streamed request. Longer
+    pages are read chunk by chunk while earlier chunks are being summarized (at most
+    `max_inflight` at a time, by default the pipeline's concurrency); the partial
+    summaries are merged, in rounds if they are long, and the final merge is streamed.
+
+    Args:
+        pipeline: The DescriptionPipeline that sends (and caches) the requests.
+        chunks: The page's text in order, e.g. from iter_page_text or, offline, iter_text_chunks.
+        chunk_chars: Characters of page text per chunk; also bounds each reduce request.
+        max_inflight: Chunk summaries allowed in flight while reading the page.
+
+    Yields:
+        Pieces of the final summary text, in order.
+    """
+    max_inflight = max_inflight or pipeline.concurrency
+    with span("summarize_map", chunk_chars=chunk_chars) as stage:
+        if not hasattr(chunks, "__anext__"):
+            chunks = _aiter(chunks)
+        first = second = None
+        try:
+            first = await chunks.__anext__()
+            second = await chunks.__anext__()
+        except StopAsyncIteration:
+            pass
+        if first is None:
+            stage.set(chunks=0)
+            return  # No visible text to summarize
+
+        if second is None:
+            stage.set(chunks=1)
+            partials = None
+        else:
+            tasks: List[asyncio.Task] = []
+
+            def submit(text: str):
+                prompt = MAP_PROMPT.format(part=len(tasks) + 1, text=text)
+                tasks.append(asyncio.create_task(pipeline.complete(_messages(prompt))))
+
+            try:
+                submit(first)
+                submit(second)
+                async for text in chunks:
+                    while sum(1 for task in tasks if not task.done()) >= max_inflight:
+                        await asyncio.wait([task for task in tasks if not task.done()],
+                                           return_when=asyncio.FIRST_COMPLETED)
+                    submit(text)
+                partials = list(await asyncio.gather(*tasks))
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            stage.set(chunks=len(tasks))
+
+    if partials is None:
+        async for piece in pipeline.stream(_messages(SUMMARY_PROMPT.format(text=first))):
+            yield piece
+        return
+
+    with span("summarize_reduce", partials=len(partials)) as stage:
+        rounds = 0
+        while sum(len(summary) for summary in partials) > chunk_chars and len(partials) > 1:
+            groups = _group(partials, chunk_chars)
+            if len(groups) == len(partials):  # Every summary is a chunk on its own; merge in pairs
+                groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+            partials = list(await asyncio.gather(*(pipeline.complete(_messages(_reduce_prompt(group)))
+                                                   for group in groups)))
+            rounds += 1
+        stage.set(rounds=rounds + 1)
+    logger.info(f"Summarizing page from {len(partials)} partial summaries after {rounds} intermediate rounds")
+
+    async for piece in pipeline.stream(_messages(_reduce_prompt(partials))):
+        yield piece
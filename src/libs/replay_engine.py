@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from libs.element_table import ElementTable
+from libs.embedding_cache import EmbeddingCache
+from libs.embedding_matcher import encode_texts_async, top_k_scores
+from libs.find_elements_v1 import SIMILARITY_THRESHOLD as TASK_THRESHOLD, rank_elements
+from libs.intent_index import element_target
+from libs.intents_to_links import SIMILARITY_THRESHOLD as LINKS_THRESHOLD, rank_links
+from libs.llm_pipeline import DESCRIBE_INSTRUCTION, DESCRIBE_SYSTEM_PROMPT, DescriptionPipeline
+from libs.model_registry import DEFAULT_MODEL_NAME, get_model
+from libs.page_capture import PageCapture
+from libs.page_summarizer import iter_text_chunks, stream_text_summary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLDS = [round(0.05 * i, 2) for i in range(19)]  # 0.0 to 0.9
+
+# The thresholds the live matchers use, and whether a score equal to it is accepted.
+MATCHER_THRESHOLDS = {"links": (LINKS_THRESHOLD, True), "task": (TASK_THRESHOLD, False)}
+
+# Each worker loads its own copy of the model, so the default stops well short of a large machine's core count.
+MAX_DEFAULT_WORKERS = 8
+
+
+def normalize_label(text: Optional[str]) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+def load_labels(path: str) -> List[Dict]:
+    """Reads labeled intents from a JSON array or a JSON Lines file.
+
+    Each label is {"page": ..., "intent": ..., "expected": ...}, like bench/intents.json.
+    "page" names a capture, its URL or the URL's last path segment; an "expected" of
+    null means nothing on the page should match, which is what a threshold is for.
+    When several elements share the expected text (two "Home" links), add
+    "expected_id" (the element's stamp in the capture) or "expected_target" (tag,
+    text and attributes, as the intent index stores them) to say which one.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        labels = json.loads(content)
+    else:
+        labels = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for i, label in enumerate(labels):
+        if "page" not in label or "intent" not in label:
+            raise ValueError(f"Label {i} needs a 'page' and an 'intent'")
+    return labels
+
+
+def assign_labels(captures: Sequence[PageCapture], labels: List[Dict]) -> Dict[str, List[Dict]]:
+    """Groups labels by the directory of the capture they refer to.
+
+    Labels whose page matches no capture, or a URL segment shared by several
+    captures, are left out with a warning; name those by capture name or full URL.
+    """
+    by_key: Dict[str, List[PageCapture]] = {}
+    for capture in captures:
+        keys = {os.path.basename(urlparse(capture.url).path.rstrip("/")), capture.url, capture.name}
+        for key in keys:
+            by_key.setdefault(key, []).append(capture)
+    assigned: Dict[str, List[Dict]] = {}
+    missing, ambiguous = set(), set()
+    for label in labels:
+        matches = {capture.directory: capture for capture in by_key.get(label["page"], [])}
+        if len(matches) > 1:
+            ambiguous.add(label["page"])
+            continue
+        if not matches:
+            missing.add(label["page"])
+            continue
+        (directory,) = matches
+        assigned.setdefault(directory, []).append(dict(label, labeled="expected" in label))
+    if missing:
+        logger.warning(f"No capture found for {len(missing)} labeled pages: {sorted(missing)[:5]}")
+    if ambiguous:
+        logger.warning(f"Skipping labels for {len(ambiguous)} pages that match several captures:"
+                       f" {sorted(ambiguous)[:5]}; name them by capture name or full URL")
+    return assigned
+
+
+class CaptureRanker:
+    """Ranker with rank_texts_async's contract over texts embedded once per capture.
+
+    `prepare` encodes a capture's element texts and all of its intents in one batch;
+    `rank` then only scores, so both matchers and every intent reuse the same rows.
+    No embedding cache is involved, so replay workers never write to a shared file.
+    """
+
+    def __init__(self):
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    async def prepare(self, model_name: str, texts: List[str]):
+        missing = [text for text in dict.fromkeys(texts) if text not in self._vectors]
+        if missing:
+            self._vectors.update(zip(missing, await encode_texts_async(model_name, missing)))
+
+    async def rank(self, model_name: str, query: str, texts: List[str], top_k: int = 5,
+                   cache: Optional[EmbeddingCache] = None, candidates: Optional[List[int]] = None) -> List[Dict]:
+        if candidates is None:
+            candidates = list(range(len(texts)))
+        if not candidates:
+            return []
+        await self.prepare(model_name, [query] + [texts[i] for i in candidates])
+        embeddings = np.stack([self._vectors[texts[i]] for i in candidates])
+        ranked = top_k_scores(embeddings @ self._vectors[query], top_k)
+        for result in ranked:
+            result["index"] = candidates[result["index"]]
+        return ranked
+
+
+def expected_rows(table: ElementTable, label: Dict) -> List[int]:
+    """Rows of `table` the label's expected element could be: by stamp, by target, else by text."""
+    if label.get("expected_id") is not None:
+        return [i for i, stamp_id in enumerate(table.ids) if stamp_id == str(label["expected_id"])]
+    if label.get("expected_target") is not None:
+        target = label["expected_target"]
+        return [i for i in range(len(table)) if element_target(table, i) == target]
+    if not label.get("expected"):
+        return []
+    expected = normalize_label(label["expected"])
+    return [i for i, text in enumerate(table.texts) if normalize_label(text) == expected]
+
+
+def _outcome(match: Optional[Dict], expected: List[int]) -> Dict:
+    """A hit is the expected element itself, not another one with the same text."""
+    if match is None:
+        return {"label": None, "index": None, "similarity": None, "hit": False}
+    return {"label": " ".join((match["label"] or "").split()), "index": match["index"],
+            "similarity": float(match["similarity"]), "hit": len(expected) == 1 and match["index"] == expected[0]}
+
+
+async def replay_capture(capture: PageCapture, labels: List[Dict], model_name: str = DEFAULT_MODEL_NAME,
+                         prefilter_top_n: Optional[int] = 20) -> List[Dict]:
+    """Runs both matchers for each labeled intent against one capture, without a browser.
+
+    Scores are reported whatever their value; thresholds are applied afterwards by
+    `threshold_sweep`, so one replay evaluates every candidate threshold.
+    """
+    table = capture.table()
+    ranker = CaptureRanker()
+    await ranker.prepare(model_name, table.embedding_texts("link") + table.embedding_texts("element")
+                         + [label["intent"] for label in labels])
+    results = []
+    for label in labels:
+        expected = expected_rows(table, label)
+        ambiguous = label.get("labeled", True) and len(expected) > 1
+        if ambiguous:
+            logger.warning(f"'{label.get('expected')}' matches {len(expected)} elements on {capture.name};"
+                           f" add expected_id or expected_target to score '{label['intent']}'")
+        elif label.get("labeled", True) and label.get("expected") and not expected:
+            logger.warning(f"Expected element '{label['expected']}' for '{label['intent']}' is not on {capture.name}")
+        started = time.perf_counter()
+        link = await rank_links(table, label["intent"], model_name=model_name, ranker=ranker.rank,
+                                prefilter_top_n=prefilter_top_n)
+        element = await rank_elements(table, label["intent"], model_name=model_name, ranker=ranker.rank)
+        results.append({
+            "page": capture.name,
+            "url": capture.url,
+            "intent": label["intent"],
+            "expected": label.get("expected"),
+            "labeled": label.get("labeled", True),
+            "ambiguous": ambiguous,
+            "links": _outcome(link, expected),
+            "task": _outcome(element, expected),
+            "seconds": time.perf_counter() - started,
+        })
+    return results
+
+
+def _init_worker(model_name: str):
+    logging.basicConfig(level=logging.WARNING)
+    get_model(model_name)  # Load once per worker, before the first shard arrives
+
+
+def _replay_shard(jobs: List[Tuple[str, List[Dict]]], model_name: str, prefilter_top_n: Optional[int]) -> List[Dict]:
+    """Runs in a worker process: replays each (capture directory, labels) job in turn."""
+
+    async def run() -> List[Dict]:
+        results = []
+        for directory, labels in jobs:
+            try:
+                results.extend(await replay_capture(PageCapture.load(directory), labels, model_name, prefilter_top_n))
+            except Exception as e:
+                logger.error(f"Replay of {directory} failed: {e}")
+        return results
+
+    return asyncio.run(run())
+
+
+def _shards(jobs: List[Tuple[str, List[Dict]]], count: int) -> List[List[Tuple[str, List[Dict]]]]:
+    """Splits jobs into `count` shards of about the same number of intents, largest jobs first."""
+    shards: List[List[Tuple[str, List[Dict]]]] = [[] for _ in range(max(1, min(count, len(jobs))))]
+    sizes = [0] * len(shards)
+    for job in sorted(jobs, key=lambda job: -len(job[1])):
+        smallest = sizes.index(min(sizes))
+        shards[smallest].append(job)
+        sizes[smallest] += len(job[1])
+    return shards
+
+
+def replay_matchers(assigned: Dict[str, List[Dict]], model_name: str = DEFAULT_MODEL_NAME,
+                    workers: Optional[int] = None, prefilter_top_n: Optional[int] = 20,
+                    shards_per_worker: int = 4) -> List[Dict]:
+    """Replays labeled intents against their captures across `workers` processes.
+
+    Captures are spread over several shards per worker so a slow shard does not leave
+    the other workers idle; each worker loads the model once. With one worker the
+    replay runs in this process.
+
+    Args:
+        assigned: Labels per capture directory, as returned by `assign_labels`.
+        model_name: Sentence transformer (or backend spec) the matchers embed with.
+        workers: Worker processes (default: CPU count, at most MAX_DEFAULT_WORKERS).
+        prefilter_top_n: Lexical prefilter size for the link matcher, as in map_intent_to_link.
+        shards_per_worker: Shards queued per worker.
+
+    Returns:
+        One result per intent, in no particular order.
+    """
+    jobs = list(assigned.items())
+    workers = max(1, min(workers or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS), len(jobs)))
+    if workers == 1:
+        return _replay_shard(jobs, model_name, prefilter_top_n)
+
+    results = []
+    shards = _shards(jobs, workers * shards_per_worker)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(model_name,)) as executor:
+        futures = [executor.submit(_replay_shard, shard, model_name, prefilter_top_n) for shard in shards]
+        for i, future in enumerate(futures):
+            results.extend(future.result())
+            logger.info(f"Replayed shard {i + 1}/{len(shards)} ({len(results)} intents so far)")
+    return results
+
+
+def threshold_sweep(results: List[Dict], matcher: str, thresholds: Sequence[float] = DEFAULT_THRESHOLDS) -> Dict:
+    """Accuracy of `matcher` at each threshold over the labeled results.
+
+    An intent is handled correctly when its expected element is the top match and
+    clears the threshold, or when it has no expected element and nothing clears it.
+    Labels whose expected text names several elements are left out.
+
+    Returns:
+        {"current": ..., "recommended": ..., "sweep": [...]}, each point with the
+        threshold, accuracy, precision (correct among accepted) and recall (of intents
+        that have an expected element).
+    """
+    labeled = [result for result in results if result["labeled"] and not result.get("ambiguous")]
+    positives = sum(1 for result in labeled if result["expected"])
+    current, inclusive = MATCHER_THRESHOLDS[matcher]
+
+    def point(threshold: float) -> Dict:
+        correct = accepted = accepted_hits = 0
+        for result in labeled:
+            outcome = result[matcher]
+            similarity = outcome["similarity"]
+            ok = similarity is not None and (similarity >= threshold if inclusive else similarity > threshold)
+            accepted += ok
+            accepted_hits += ok and outcome["hit"]
+            correct += (ok and outcome["hit"]) if result["expected"] else not ok
+        return {
+            "threshold": threshold,
+            "accuracy": correct / len(labeled) if labeled else 0.0,
+            "precision": accepted_hits / accepted if accepted else 0.0,
+            "recall": accepted_hits / positives if positives else 0.0,
+        }
+
+    sweep = [point(threshold) for threshold in thresholds]
+    recommended = max(sweep, key=lambda p: (p["accuracy"], p["precision"], -p["threshold"])) if labeled else None
+    return {"current": point(current), "recommended": recommended, "sweep": sweep}
+
+
+async def describe_captures(captures: Sequence[PageCapture], pipeline: DescriptionPipeline, summarize: bool = True,
+                            max_pages: int = 4) -> Dict[str, Dict]:
+    """Describes each capture's visible elements and summarizes its text, as automate2 does live.
+
+    Pages are processed `max_pages` at a time; the pipeline bounds the requests in flight.
+    """
+    semaphore = asyncio.Semaphore(max_pages)
+
+    async def describe(capture: PageCapture) -> Tuple[str, Dict]:
+        async with semaphore:
+            started = time.perf_counter()
+            table = capture.table()
+            snippets = {table.selector(i): table.html[i] for i in range(len(table))
+                        if table.visible[i] and table.html is not None and table.html[i] is not None}
+            report = {"descriptions": await pipeline.describe_batched(snippets, DESCRIBE_INSTRUCTION,
+                                                                      DESCRIBE_SYSTEM_PROMPT,
+                                                                      error_text="Error describing element.")}
+            if summarize:
+                chunks = iter_text_chunks(capture.text())
+                report["summary"] = "".join([piece async for piece in stream_text_summary(pipeline, chunks)]).strip()
+            report["seconds"] = time.perf_counter() - started
+            return capture.name, report
+
+    return dict(await asyncio.gather(*(describe(capture) for capture in captures)))
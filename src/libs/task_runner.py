@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext
+
+from libs.action_planner import run_plan
+from libs.intent_index import IntentIndex
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.network_policy import NetworkMonitor, NetworkPolicy, apply_network_policy, navigate
+
+logger = logging.getLogger(__name__)
+
+
+def load_tasks(path: str) -> List[Dict]:
+    """Reads tasks from a JSON array or a JSON Lines file.
+
+    Each task is {"url": ..., "intents": [...]} with an optional "id".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        tasks = json.loads(content)
+    else:
+        tasks = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for i, task in enumerate(tasks):
+        task.setdefault("id", f"task_{i}")
+        if "url" not in task or not isinstance(task.get("intents"), list):
+            raise ValueError(f"Task {task['id']} needs a 'url' and a list of 'intents'")
+    return tasks
+
+
+async def run_task(context: BrowserContext, task: Dict, matcher: str = "links",
+                   model_name: str = DEFAULT_MODEL_NAME, navigation_timeout: float = 30000,
+                   monitor: Optional[NetworkMonitor] = None, intent_index: Optional[IntentIndex] = None) -> Dict:
+    """Runs one task's intents in order on a new page of `context` and reports each step.
+
+    With an `intent_index`, intents resolved on earlier runs are clicked without retrieval.
+    """
+    started = time.perf_counter()
+    result = {"id": task["id"], "url": task["url"], "steps": [], "ok": True}
+    page = await context.new_page()
+    try:
+        result["navigation"] = await navigate(page, task["url"], monitor, timeout=navigation_timeout)
+        # Later intents depend on earlier ones, so the plan stops at the first failed step
+        plan = await run_plan(page, task["intents"], matcher=matcher, model_name=model_name,
+                              settle_state=monitor.policy.wait_until if monitor else "domcontentloaded",
+                              intent_index=intent_index)
+        result["steps"] = plan["steps"]
+        result["ok"] = plan["ok"]
+    except Exception as e:
+        logger.error(f"Task {task['id']} failed: {e}")
+        result["ok"] = False
+        result["error"] = str(e)
+    finally:
+        await page.close()
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+async def run_tasks(browser: Browser, tasks: List[Dict], pool_size: Optional[int] = None,
+                    policy: Optional[NetworkPolicy] = None, **kwargs) -> Dict:
+    """Runs tasks concurrently, each in its own BrowserContext, at most `pool_size` at a time.
+
+    Returns the per-task results plus aggregate counts and timings.
+    """
+    pool_size = pool_size or os.cpu_count() or 1
+    semaphore = asyncio.Semaphore(pool_size)
+    started = time.perf_counter()
+
+    async def isolated(task: Dict) -> Dict:
+        async with semaphore:
+            context = await browser.new_context()  # Fresh cookies and storage per task
+            try:
+                monitor = await apply_network_policy(context, policy)
+                return await run_task(context, task, monitor=monitor, **kwargs)
+            finally:
+                await context.close()
+
+    results = await asyncio.gather(*(isolated(task) for task in tasks))
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for result in results if result["ok"])
+    navigations = [result["navigation"] for result in results if "navigation" in result]
+    return {
+        "pool_size": pool_size,
+        "tasks": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "seconds": elapsed,
+        "tasks_per_second": len(results) / elapsed if elapsed else 0.0,
+        "bytes_saved": sum(navigation.get("bytes_saved", 0) for navigation in navigations),
+        "requests_blocked": sum(navigation.get("blocked", 0) for navigation in navigations),
+        "results": list(results),
+    }
@@ -9,15 +9,22 @@ from playwright.async_api import async_playwright, BrowserContext, Page, Locator
 from dotenv import load_dotenv
 
 from automate3 import find_element_by_task, findAndClickThisTask
+from libs.action_planner import run_plan
+from libs.instrumentation import span, trace_from_env
+from libs.intent_index import get_intent_index
 from libs.intents_to_links import map_intent_to_link
+from libs.network_policy import apply_network_policy, interactive_policy, navigate
+from libs.page_index import get_page_index
 
 async def main():
+    trace_from_env()  # AUTOMATION_TRACE=trace.json records per-stage timings for this session
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
         context = await browser.new_context()
+        monitor = await apply_network_policy(context, interactive_policy())  # Cache static assets
         page = await context.new_page()
 
-        await page.goto("https://parabank.parasoft.com/parabank/index.htm")
+        await navigate(page, "https://parabank.parasoft.com/parabank/index.htm", monitor)
 
         while True:
 
@@ -26,9 +33,10 @@ async def main():
             # print("2. Extract Interactive Elements")
             print("3. Find Element by Task and Click (Example Task)")
             print("4. Map intents to links")
+            print("5. Run several intents in order")
             print("99. Exit")
 
-            choice = input("Enter your choice (1-4): ")
+            choice = input("Enter your choice (1-5): ")
 
             try:
                 choice = int(choice)
@@ -45,17 +53,28 @@ async def main():
                     await findAndClickThisTask(page, target_task)
                 elif choice == 4:
                     target_task = input("Enter your intent: ")
-                    matching_link = await map_intent_to_link(page, target_task)
+                    matching_link = await map_intent_to_link(page, target_task, index=get_page_index(page),
+                                                             intent_index=get_intent_index())
                     if matching_link:
                         print(f"Best matching link: {matching_link['label']} (href: {matching_link['href']})")
-                        await matching_link["locator"].click()  # Click the link!
+                        with span("action", kind="click", label=matching_link["label"]):
+                            await matching_link["locator"].click()  # Click the link!
                     else:
                         print(f"No link found matching the intent: {target_task}")
 
+                elif choice == 5:
+                    intents = [intent.strip() for intent in input("Enter intents separated by ';': ").split(";")]
+                    plan = await run_plan(page, [intent for intent in intents if intent],
+                                          intent_index=get_intent_index())
+                    for step in plan["steps"]:
+                        print(f"{step['intent']}: {step['status']} {step.get('label', '')}"
+                              f" ({step['seconds']:.2f}s, prefetched: {step['prefetched']})")
+                    print(f"Finished in {plan['seconds']:.2f}s, {plan['settle_seconds']:.2f}s of it waiting for pages")
+
                 elif choice == 99:
                     break
                 else:
-                    print("Invalid choice. Please enter a number between 1 and 4.")
+                    print("Invalid choice. Please enter a number between 1 and 5.")
             except ValueError:
                 print("Invalid input. Please enter a number.")
 
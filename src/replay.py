@@ -0,0 +1,96 @@
+# replay matchers (and optionally describers) against saved captures, no browser needed
+# python replay.py captures --labels bench/intents.json --workers 8
+# python replay.py captures --labels labels.jsonl --describe --output bench/results/replay.json
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+# Configure logging before the libs configure it on import
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from libs.description_cache import DescriptionCache
+from libs.llm_pipeline import DescriptionPipeline
+from libs.model_registry import DEFAULT_MODEL_NAME
+from libs.page_capture import iter_captures
+from libs.replay_engine import (DEFAULT_THRESHOLDS, assign_labels, describe_captures, load_labels, replay_matchers,
+                                threshold_sweep)
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the matchers against captured pages and tune their thresholds.")
+    parser.add_argument("captures", help="Directory written by capture.py")
+    parser.add_argument("--labels", help="JSON or JSON Lines file of {\"page\", \"intent\", \"expected\"} labels")
+    parser.add_argument("--intent", action="append", default=[],
+                        help="Unlabeled intent to run against every capture (repeatable)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Sentence transformer (or backend spec) to use")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count, at most 8)")
+    parser.add_argument("--prefilter-top-n", type=int, default=20,
+                        help="Lexical prefilter size for the link matcher (0 disables it)")
+    parser.add_argument("--describe", action="store_true",
+                        help="Also describe elements and summarize text with the LLM (OPENAI_BASE_URL may point"
+                             " at llm_stub_server.py)")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results", "replay.json"))
+    args = parser.parse_args()
+
+    if not args.labels and not args.intent:
+        parser.error("give --labels and/or --intent")
+
+    captures = list(iter_captures(args.captures))
+    if not captures:
+        parser.error(f"no captures found in {args.captures}")
+    assigned = assign_labels(captures, load_labels(args.labels)) if args.labels else {}
+    for capture in captures:
+        assigned.setdefault(capture.directory, []).extend(
+            {"page": capture.name, "intent": intent, "labeled": False} for intent in args.intent)
+    intents = sum(len(labels) for labels in assigned.values())
+    logger.info(f"Replaying {intents} intents against {len(assigned)} of {len(captures)} captures")
+
+    started = time.perf_counter()
+    results = replay_matchers(assigned, model_name=args.model, workers=args.workers,
+                              prefilter_top_n=args.prefilter_top_n or None)
+    seconds = time.perf_counter() - started
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": args.model,
+        "captures": len(assigned),
+        "intents": len(results),
+        "seconds": seconds,
+        "intents_per_second": len(results) / seconds if seconds else 0.0,
+        "matchers": {matcher: threshold_sweep(results, matcher, DEFAULT_THRESHOLDS) for matcher in ("links", "task")},
+        "results": sorted(results, key=lambda result: (result["page"], result["intent"])),
+    }
+
+    if args.describe:
+        pipeline = DescriptionPipeline(cache=DescriptionCache())
+        described = [capture for capture in captures if capture.directory in assigned]
+        describe_started = time.perf_counter()
+        report["descriptions"] = asyncio.run(describe_captures(described, pipeline))
+        report["describe_seconds"] = time.perf_counter() - describe_started
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{len(results)} intents over {len(assigned)} captures in {seconds:.1f}s"
+          f" ({report['intents_per_second']:.1f} intents/s)")
+    for matcher, sweep in report["matchers"].items():
+        current, recommended = sweep["current"], sweep["recommended"]
+        if recommended is None:
+            continue
+        print(f"{matcher:6} threshold {current['threshold']:.2f}: accuracy {current['accuracy']:.0%},"
+              f" precision {current['precision']:.0%}, recall {current['recall']:.0%}"
+              f" | best {recommended['threshold']:.2f}: accuracy {recommended['accuracy']:.0%},"
+              f" precision {recommended['precision']:.0%}, recall {recommended['recall']:.0%}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
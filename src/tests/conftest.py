@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The libs are imported as `libs.<module>`, as the scripts in src/ do.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import asyncio
+
+from libs.element_table import ElementTable
+from libs.intents_to_links import LEXICAL_FLOOR, rank_links
+
+
+def _table(labels):
+    table = ElementTable("https://example.test/")
+    for i, label in enumerate(labels):
+        table.append(str(i + 1), "a", label, label, {"href": f"/{label.lower().replace(' ', '-')}"}, True, None)
+    return table
+
+
+def test_below_floor_fallback_ranks_every_link_and_keeps_the_winner():
+    """'sign me up' shares only trigrams with the links, so every link is reranked and the
+    embedding winner (Register) need not be among the lexical hits."""
+    table = _table(["Home", "About Us", "Services", "Register", "Log In"])
+    seen = {}
+
+    async def ranker(model_name, query, texts, top_k=5, cache=None, candidates=None):
+        seen["candidates"] = candidates
+        return [{"index": 3, "score": 0.61}, {"index": 4, "score": 0.35}]
+
+    match = asyncio.run(rank_links(table, "sign me up", ranker=ranker))
+
+    assert seen["candidates"] is None
+    assert match["label"] == "Register"
+    assert match["lexical_score"] is None or match["lexical_score"] < LEXICAL_FLOOR
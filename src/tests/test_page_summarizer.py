@@ -0,0 +1,40 @@
+import asyncio
+
+from libs import page_summarizer
+from libs.page_summarizer import iter_page_text, iter_text_chunks
+
+
+def test_chunks_never_exceed_chunk_chars():
+    text = ("word " * 40 + "\n") * 20
+    chunks = list(iter_text_chunks(text, chunk_chars=50))
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks).split() == text.split()
+
+
+class _NavigatingPage:
+    """Serves one chunk, then behaves as if the page navigated and the stored text is gone."""
+
+    def __init__(self, text):
+        self.text = text
+        self.chunks = 0
+
+    async def evaluate(self, script, args=None):
+        if script == page_summarizer._TEXT_OPEN_SCRIPT:
+            return len(self.text)
+        if script == page_summarizer._TEXT_CHUNK_SCRIPT:
+            self.chunks += 1
+            _, start, size = args
+            if self.chunks > 1:
+                return {"text": "", "end": 0}
+            return {"text": self.text[start:start + size], "end": start + size}
+        return None
+
+
+def test_page_text_stops_when_the_page_navigates():
+    page = _NavigatingPage("x" * 1000)
+
+    async def collect():
+        return [chunk async for chunk in iter_page_text(page, chunk_chars=100)]
+
+    assert asyncio.run(asyncio.wait_for(collect(), timeout=5)) == ["x" * 100]
+    assert page.chunks == 2